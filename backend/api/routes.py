@@ -1,26 +1,153 @@
-from flask import Blueprint, jsonify
-from ..data_extractor import process_annual_report
-import os
+from flask import Blueprint, current_app, jsonify, request
 from pathlib import Path
+import hashlib
+import logging
+import os
+import tempfile
+
+import report_jobs
+from dataset import DEFAULT_COMPANY
+from reports import list_reports
+from serialization import json_response
 
 api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
+
+# Uploads must start with the PDF magic bytes
+PDF_MAGIC = b'%PDF-'
+
+def _report_status(pdf_path):
+    """Status of one report, queueing its extraction (and starting workers) if it has no result yet."""
+    config = current_app.config
+    state = report_jobs.report_status(pdf_path, config['REPORT_CACHE_DIR'], config['REPORT_QUEUE'])
+    if state['status'] == 'pending':
+        report_jobs.ensure_workers(config['REPORT_QUEUE'], config['REPORT_CACHE_DIR'], config['DATA_DIR'])
+    return state
+
+def _job_response(job, status=200):
+    job['url'] = f"/api/reports/jobs/{job['id']}"
+    return jsonify(job), status
 
 @api.route('/api/financial-data', methods=['GET'])
 def get_financial_data():
     """
-    Endpoint to get processed financial data from PDFs
-    """
-    data_dir = Path(__file__).parent.parent.parent / 'data'
-    financial_data = {}
-    
-    # Process each PDF file
-    for pdf_file in data_dir.glob('*.pdf'):
-        year = pdf_file.stem.split('_')[1][:4]  # Extract year from filename
-        data = process_annual_report(str(pdf_file))
-        if data:
-            financial_data[year] = data
-    
-    return jsonify(financial_data)
+    Extracted data for every annual report PDF, keyed by report. Reports not
+    extracted yet are queued in the background and listed as pending.
+    """
+    try:
+        reports = {}
+        for pdf_path in list_reports(current_app.config['REPORTS_DIR']):
+            state = _report_status(pdf_path)
+            reports[state['report']] = state
+        return json_response({
+            'reports': reports,
+            'pending': sum(1 for state in reports.values() if state['status'] == 'pending'),
+        })
+    except Exception as e:
+        logger.error(f"Error reading extracted report data: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/financial-data/<report>', methods=['GET'])
+def get_report_data(report):
+    """Extracted data for one report (file name without .pdf); 202 while it is being extracted."""
+    try:
+        pdf_path = Path(current_app.config['REPORTS_DIR']) / f'{Path(report).name}.pdf'
+        if not pdf_path.is_file():
+            return jsonify({'error': f'Report {report} not found'}), 404
+        state = _report_status(pdf_path)
+        if state['status'] == 'pending':
+            return jsonify(state), 202, {'Retry-After': '30'}
+        return json_response(state)
+    except Exception as e:
+        logger.error(f"Error reading extracted data for report {report}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _store_upload(upload, reports_dir):
+    """
+    Write an uploaded PDF to `reports_dir` as <sha256>.pdf, streaming it through
+    the hash. Returns (path, key); a report already stored under any name is reused.
+    """
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=reports_dir)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            first = True
+            for chunk in iter(lambda: upload.stream.read(1 << 20), b''):
+                if first and not chunk.startswith(PDF_MAGIC):
+                    raise ValueError('Uploaded file is not a PDF')
+                first = False
+                digest.update(chunk)
+                f.write(chunk)
+        if first:
+            raise ValueError('Uploaded file is empty')
+        key = digest.hexdigest()
+        existing = next((p for p in list_reports(reports_dir) if report_jobs.report_key(p) == key), None)
+        if existing is not None:
+            os.unlink(tmp)
+            return existing, key
+        path = reports_dir / f'{key}.pdf'
+        os.replace(tmp, path)
+        return path, key
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+@api.route('/api/reports', methods=['POST'])
+def upload_report():
+    """
+    Store an uploaded annual report (multipart field 'file', optional 'year')
+    and queue its extraction. Returns the job; poll its url for progress.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': "Upload the report PDF in the multipart field 'file'"}), 400
+        year = request.form.get('year')
+        if year is not None:
+            if not year.isdigit():
+                return jsonify({'error': "Parameter 'year' must be a year, e.g. 2024"}), 400
+            year = int(year)
+        config = current_app.config
+        try:
+            path, key = _store_upload(upload, Path(config['REPORTS_DIR']))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        job_id = report_jobs.enqueue(config['REPORT_QUEUE'], path, key, DEFAULT_COMPANY, year, merge=True)
+        job = report_jobs.get_job(config['REPORT_QUEUE'], job_id)
+        if job['status'] == 'done':
+            return _job_response(job)
+        report_jobs.ensure_workers(config['REPORT_QUEUE'], config['REPORT_CACHE_DIR'], config['DATA_DIR'])
+        return _job_response(job, 202)
+    except Exception as e:
+        logger.error(f"Error storing uploaded report: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/reports/jobs', methods=['GET'])
+def list_report_jobs():
+    """Recent extraction jobs, newest first (?status=queued|running|done|failed&limit=)."""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        jobs = report_jobs.list_jobs(current_app.config['REPORT_QUEUE'], request.args.get('status'), limit)
+        return jsonify(jobs)
+    except ValueError:
+        return jsonify({'error': "Parameter 'limit' must be a number"}), 400
+    except Exception as e:
+        logger.error(f"Error listing report jobs: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@api.route('/api/reports/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """One extraction job: status, current stage, per-stage progress and error."""
+    try:
+        job = report_jobs.get_job(current_app.config['REPORT_QUEUE'], job_id)
+        if job is None:
+            return jsonify({'error': f'Report job {job_id} not found'}), 404
+        return _job_response(job)
+    except Exception as e:
+        logger.error(f"Error reading report job {job_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
 
 @api.route('/api/revenue', methods=['GET'])
 def get_revenue():
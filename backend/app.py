@@ -1,39 +1,73 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, send_from_directory, request
 from flask_cors import CORS
-import pandas as pd
+import math
 import os
+from functools import partial
 from pathlib import Path
 import logging
-from prophet import Prophet
-
-def forecast_metric(df, metric, periods=3):
-    # df: DataFrame with columns ['year', metric]
-    df_prophet = df[['year', metric]].rename(columns={'year': 'ds', metric: 'y'})
-    df_prophet['ds'] = pd.to_datetime(df_prophet['ds'], format='%Y')
-    model = Prophet()
-    model.fit(df_prophet)
-    future = model.make_future_dataframe(periods=periods, freq='Y')
-    forecast = model.predict(future)
-    # Return only the forecasted values for the new periods
-    return forecast[['ds', 'yhat']].tail(periods)
-
-def apply_scale(value, scale):
-    if pd.isna(value) or pd.isna(scale):
-        return None
-    value = float(value)
-    if scale == 'K':
-        return value * 1000
-    elif scale == 'Mn':
-        return value * 1000000
-    return value
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+from forecasting import ENGINES, DEFAULT_ENGINE, FAST_ENGINES, MAX_PERIODS, MIN_PERIODS, forecast_batch_response, forecast_response
+import forecast_jobs
+import metrics
+import profiling
+import report_jobs
+import reports
+from api.routes import api
+from currency import (
+    BASE_CURRENCY, RATES_FILE, build_financial_records, cache_name, default_currency, financials_in, load_rates
+)
+from dataset import (
+    COMPANY_CACHE_BYTES, DEFAULT_COMPANY, RELOAD_INTERVAL, build_companies, configure_company_cache, get_dataset,
+    parse_year_range, resolve_company, watch_dataset
+)
+from serialization import cached_response, json_response, precompute_responses, requested_format
+from financial_store import build_financial_store, columns_to_records
+from insights import build_insights
+from ratios import build_ratio_records, build_ratio_view
+from dashboard import (
+    DASHBOARD_FORECAST_METRICS, build_dashboard, build_dashboard_with_forecasts, filter_dashboard
+)
+from export import EXPORT_FORMATS, EXPORT_SOURCES, stream_export
+from right_issues import (
+    MAX_PAGE_SIZE, build_right_issue_index, build_right_issue_records, cursor_scope, encode_cursor, decode_cursor
+)
+from shareholders import (
+    build_all_shareholders, build_shareholders_by_year, build_ownership_matrix, build_shareholder_index
+)
 
 # Get the absolute path to the data_cleaned directory
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / 'data_cleaned'
 
+# Settings understood by create_app; each can also be set through an environment variable of the same name
+DEFAULT_CONFIG = {
+    'DATA_DIR': DATA_DIR,
+    'DATA_RELOAD_INTERVAL': RELOAD_INTERVAL,
+    # Build the dashboard forecasts along with the data, not on the first forecast=1 request
+    'WARM_FORECASTS': False,
+    # Memory budget for the lazily loaded Datasets of companies other than the default one
+    'COMPANY_CACHE_BYTES': COMPANY_CACHE_BYTES,
+    # Exchange rates used to serve the LKR metrics in other currencies (see currency.py)
+    'RATES_FILE': RATES_FILE,
+    'FORECAST_WORKERS': forecast_jobs.MAX_WORKERS,
+    'FORECAST_MAX_PENDING': forecast_jobs.MAX_PENDING_JOBS,
+    # Forecast job states and results, shared by every web process so any of them can answer a poll
+    'FORECAST_QUEUE': DATA_DIR / forecast_jobs.QUEUE_FILE,
+    # On-demand profiling (see profiling.py) is off unless a token is set
+    'PROFILE_TOKEN': '',
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_INTERVAL': 0.005,
+    'PROFILE_DIR': BASE_DIR / 'profiles',
+    # Annual report PDFs and their extraction results (see reports.py)
+    'REPORTS_DIR': reports.REPORTS_DIR,
+    'REPORT_CACHE_DIR': reports.REPORT_CACHE_DIR,
+    # Persistent extraction job queue, and extraction worker processes started per web process (0: run them separately)
+    'REPORT_QUEUE': DATA_DIR / report_jobs.QUEUE_FILE,
+    'REPORT_WORKERS': report_jobs.REPORT_WORKERS,
+    'MAX_CONTENT_LENGTH': 64 * 1024 * 1024,
+}
+
+routes = Blueprint('routes', __name__)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -41,283 +75,505 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.route('/')
+def warm_dataset(dataset, forecasts=False, rates=None):
+    """
+    Build the indexes, payloads and encoded responses requests use, before a
+    new data version is swapped in (and, in production, before workers fork).
+    Financial payloads are built in the default currency at the current rates.
+    """
+    rates = rates or load_rates()
+    currency = default_currency(rates)
+    if dataset.financials is not None:
+        precompute_responses(dataset, *in_currency('financials_records', build_financial_records, currency, rates))
+        dataset.derived(*in_currency('financial_store', build_financial_store, currency, rates))
+        precompute_responses(dataset, 'insights', build_insights)
+        dataset.derived('ratio_view', build_ratio_view)
+        precompute_responses(dataset, 'ratios_records', build_ratio_records)
+    if dataset.right_issues is not None:
+        dataset.derived('right_issue_index', build_right_issue_index)
+        precompute_responses(dataset, 'right_issues_records', build_right_issue_records)
+    dataset.derived('shareholder_index', build_shareholder_index)
+    precompute_responses(dataset, 'shareholders_all', build_all_shareholders)
+    precompute_responses(dataset, 'ownership_matrix', build_ownership_matrix)
+    precompute_responses(dataset, *in_currency('dashboard', build_dashboard, currency, rates))
+    if forecasts:
+        precompute_responses(dataset, *in_currency('dashboard_forecast', build_dashboard_with_forecasts,
+                                                   currency, rates))
+
+def in_currency(name, build, currency=None, rates=None):
+    """(cache name, builder) of `build` in `currency` at `rates`, by default those the request asked for."""
+    currency = currency or g.currency
+    rates = rates or g.rates
+    return cache_name(name, currency, rates), partial(build, currency=currency, rates=rates)
+
+def current_dataset():
+    """The Dataset of the company the request asked for (?company=), the default company otherwise."""
+    return get_dataset(current_app.config['DATA_DIR'], g.get('company'))
+
+@routes.before_request
+def select_company():
+    company = request.args.get('company')
+    if company:
+        g.company = resolve_company(current_app.config['DATA_DIR'], company)
+        if g.company is None:
+            return jsonify({'error': f"Unknown company '{company}'", 'companies_url': '/api/companies'}), 404
+
+def requested_currency():
+    """
+    (currency, rate table) for ?currency=, also kept on `g` for in_currency. The
+    default is DEFAULT_CURRENCY, or LKR alone when there are no rates for it.
+    Raises ValueError for a currency without rates.
+    """
+    rates = load_rates(current_app.config['RATES_FILE'])
+    currency = (request.args.get('currency') or default_currency(rates)).strip().upper()
+    if not rates.supports(currency):
+        currencies = ', '.join([BASE_CURRENCY] + rates.currencies)
+        raise ValueError(f"No exchange rates for currency '{currency}', expected one of: {currencies}")
+    g.currency, g.rates = currency, rates
+    return currency, rates
+
+def currency_error(e):
+    return jsonify({'error': str(e), 'currencies_url': '/api/currencies'}), 400
+
+@routes.after_request
+def add_rates_version(response):
+    if 'rates' in g:
+        response.headers['X-Rates-Version'] = g.rates.version
+    return response
+
+def config_from_env(environ=os.environ):
+    """DEFAULT_CONFIG overridden by any environment variables of the same names."""
+    config = dict(DEFAULT_CONFIG)
+    for key, default in DEFAULT_CONFIG.items():
+        if key in environ:
+            value = environ[key]
+            if isinstance(default, bool):
+                config[key] = value.lower() in ('1', 'true', 'yes')
+            elif isinstance(default, Path):
+                config[key] = Path(value)
+            else:
+                config[key] = type(default)(value)
+    return config
+
+def create_app(config=None):
+    """
+    Build the API. The data in config['DATA_DIR'] is loaded and warmed before
+    this returns and reloaded in the background whenever a new version is
+    published, so a server that forks after create_app starts every worker hot.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    app.config['DATA_DIR'] = Path(app.config['DATA_DIR'])
+    forecast_jobs.configure(app.config['FORECAST_WORKERS'], app.config['FORECAST_MAX_PENDING'],
+                            app.config['FORECAST_QUEUE'])
+    configure_company_cache(app.config['COMPANY_CACHE_BYTES'])
+    report_jobs.configure(app.config['REPORT_WORKERS'])
+    warm = lambda dataset: warm_dataset(dataset, forecasts=app.config['WARM_FORECASTS'],
+                                        rates=load_rates(app.config['RATES_FILE']))
+    watch_dataset(app.config['DATA_DIR'], warm=warm, interval=app.config['DATA_RELOAD_INTERVAL'])
+    app.register_blueprint(routes)
+    app.register_blueprint(api)
+    metrics.instrument(app)
+    profiling.instrument(app)
+    return app
+
+@routes.route('/')
 def index():
     return {
-        'message': 'John Keells Holdings PLC Financial Dashboard API',
+        'message': 'Listed Companies Financial Dashboard API',
+        'default_company': DEFAULT_COMPANY,
         'endpoints': {
-            '/api/financials': 'Get financial metrics data',
-            '/api/shareholders': 'Get shareholders data',
-            '/api/right-issues': 'Get right issues data'
+            '/api/companies': 'Companies that can be selected with ?company= on every data endpoint',
+            '?company=JKH': 'Serve any data, export, dashboard or forecast endpoint for that company',
+            '/api/currencies': 'Currencies the LKR metrics can be served in, with the exchange rates and their version',
+            '?currency=USD': 'Serve financials, dashboard, export and forecasts with the LKR metrics also in that currency',
+            '/api/dashboard': 'Everything the dashboard first render needs (?years=2020-2023&forecast=1)',
+            '/api/financials': 'Get financial metrics data (?years=2020-2023&metrics=eps_lkr,total_revenue_lkr)',
+            '/api/ratios': 'Margins, cost ratios, per-share figures, YoY growth and CAGR by year (?years=2020-2023&metrics=net_margin)',
+            '?format=columns': 'Columnar {field: [values]} shape for list responses; gzip/br negotiated via Accept-Encoding',
+            '/api/shareholders': 'Get shareholders data (?year=2019_20, or every year when omitted)',
+            '/api/shareholders/matrix': 'Shareholder x fiscal-year ownership matrix with rank and YoY change',
+            '/api/shareholders/resolve': 'Resolve a shareholder name to its id (?name=)',
+            '/api/shareholders/<id>/history': "One shareholder's holdings across fiscal years",
+            '/api/right-issues': 'Get right issues data (?year_from=&year_to=&min_price=&max_price=&fields=&limit=&cursor=)',
+            '/api/export/<financials|right-issues|shareholders>': 'Stream a dataset as CSV or NDJSON (?format=csv|ndjson)',
+            '/api/forecast': 'Forecast a metric (?metric=&periods=1-20&engine=linear|holt|loglinear|prophet)',
+            '/api/forecast/batch': 'Forecast several metrics in one call (?metrics=a,b,c&periods=&engine=)',
+            '/api/financial-data': 'Data extracted from each annual report PDF, keyed by report (/api/financial-data/<report> for one)',
+            '/api/reports': 'POST an annual report PDF (multipart file, optional year) to extract and publish its data',
+            '/api/reports/jobs/<id>': 'Extraction job status with per-stage progress and error (/api/reports/jobs lists recent jobs)',
+            '/api/forecast/jobs': 'POST a forecast job; poll /api/forecast/jobs/<id>?wait=<seconds> for the result',
+            '/metrics': 'Prometheus metrics: request latency/size per route, cache hits, data load and forecast fit times'
         }
     }
 
-@app.route('/api/financials', methods=['GET'])
+@routes.route('/api/companies', methods=['GET'])
+def get_companies():
+    try:
+        dataset = get_dataset(current_app.config['DATA_DIR'])
+        return jsonify({'default': DEFAULT_COMPANY, 'companies': dataset.derived('companies', build_companies)})
+    except Exception as e:
+        logger.error(f"Error listing companies: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/currencies', methods=['GET'])
+def get_currencies():
+    rates = load_rates(current_app.config['RATES_FILE'])
+    return jsonify({
+        'base': BASE_CURRENCY,
+        'default': default_currency(rates),
+        'currencies': [BASE_CURRENCY] + rates.currencies,
+        'version': rates.version,
+        'rates': rates.records(),
+    })
+
+@routes.route('/api/financials', methods=['GET'])
 def get_financials():
     try:
-        # Read the financial metrics CSV file
-        file_path = DATA_DIR / 'financial_metrics.csv'
-        if not file_path.exists():
-            logger.error(f"Financial data file not found: {file_path}")
+        dataset = current_dataset()
+        if dataset.financials is None:
+            logger.error(f"Financial data file not found in {current_app.config['DATA_DIR']}")
             return jsonify({'error': 'Financial data not found'}), 404
+        try:
+            requested_currency()
+        except ValueError as e:
+            return currency_error(e)
+        years = request.args.get('years')
+        metrics = request.args.get('metrics')
+        if not years and not metrics:
+            return cached_response(dataset, *in_currency('financials_records', build_financial_records))
 
-        df = pd.read_csv(file_path)
-        
-        # Process the data
-        processed_data = []
-        for _, row in df.iterrows():
-            data_point = {'year': int(row['year'])}
-            
-            # Process each metric and its scale
-            metrics = [
-                'total_revenue_lkr', 'total_revenue_usd',
-                'eps_lkr', 'eps_usd',
-                'share_count',
-                'net_profit_lkr', 'net_profit_usd',
-                'operating_expenses_lkr', 'operating_expenses_usd',
-                'net_asset_per_share_lkr', 'net_asset_per_share_usd',
-                'gross_profit_margin',
-                'cost_of_sales_lkr', 'cost_of_sales_usd'
-            ]
-            
-            for metric in metrics:
-                value = row.get(metric)
-                scale = row.get(f'{metric}_scale')
-                if pd.notna(value) and pd.notna(scale):
-                    data_point[metric] = apply_scale(value, scale)
-                else:
-                    data_point[metric] = None
-            
-            processed_data.append(data_point)
-        
-        return jsonify(processed_data)
+        try:
+            start, end = parse_year_range(years) if years else (None, None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        metrics = [m.strip() for m in metrics.split(',') if m.strip()] if metrics else None
+        store = dataset.derived(*in_currency('financial_store', build_financial_store))
+        try:
+            columns = store.query(dataset.company, start, end, metrics)
+        except KeyError as e:
+            return jsonify({'error': f"Unknown metrics: {e.args[0]}",
+                            'available': store.metrics(dataset.company)}), 400
+        return json_response(columns if requested_format() == 'columns' else columns_to_records(columns))
     except Exception as e:
         logger.error(f"Error processing financial data: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/shareholders', methods=['GET'])
+@routes.route('/api/ratios', methods=['GET'])
+def get_ratios():
+    try:
+        dataset = current_dataset()
+        if dataset.financials is None:
+            return jsonify({'error': 'Financial data not found'}), 404
+        years = request.args.get('years')
+        metrics = request.args.get('metrics')
+        if not years and not metrics:
+            return cached_response(dataset, 'ratios_records', build_ratio_records)
+
+        try:
+            start, end = parse_year_range(years) if years else (None, None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        metrics = [m.strip() for m in metrics.split(',') if m.strip()] if metrics else None
+        view = dataset.derived('ratio_view', build_ratio_view)
+        try:
+            columns = view.query(dataset.company, start, end, metrics)
+        except KeyError as e:
+            return jsonify({'error': f"Unknown ratios: {e.args[0]}", 'available': view.ratios()}), 400
+        return json_response(columns if requested_format() == 'columns' else columns_to_records(columns))
+    except Exception as e:
+        logger.error(f"Error computing financial ratios: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/shareholders', methods=['GET'])
 def get_shareholders():
+    dataset = current_dataset()
     year = request.args.get('year')
     if not year:
-        return jsonify({'error': 'Year parameter is required, e.g., /api/shareholders?year=2019_20'}), 400
-    filename = f'shareholders_{year}.csv'
-    file_path = DATA_DIR / filename
-    if not file_path.exists():
-        logger.error(f"Shareholders data file not found: {file_path}")
+        # No year: every fiscal year in one response, rows tagged with fiscal_year
+        return cached_response(dataset, 'shareholders_all', build_all_shareholders)
+    by_year = dataset.derived('shareholders_by_year', build_shareholders_by_year)
+    if year not in by_year:
+        logger.error(f"Shareholders data file not found for year: {year}")
         return jsonify({'error': f'Shareholders data for year {year} not found'}), 404
-    df = pd.read_csv(file_path)
-    data = df.to_dict('records')
-    return jsonify(data)
+    return cached_response(dataset, f'shareholders:{year}', lambda ds: by_year[year])
 
-@app.route('/api/right-issues', methods=['GET'])
+@routes.route('/api/shareholders/matrix', methods=['GET'])
+def get_shareholders_matrix():
+    try:
+        dataset = current_dataset()
+        if not dataset.shareholders:
+            return jsonify({'error': 'Shareholders data not found'}), 404
+        return cached_response(dataset, 'ownership_matrix', build_ownership_matrix)
+    except Exception as e:
+        logger.error(f"Error building shareholder ownership matrix: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/shareholders/resolve', methods=['GET'])
+def resolve_shareholder():
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'error': 'Name parameter is required, e.g., /api/shareholders/resolve?name=HWIC Asia Fund'}), 400
+    index = current_dataset().derived('shareholder_index', build_shareholder_index)
+    holder_id = index.resolve(name)
+    if holder_id is None:
+        return jsonify({'error': f"No shareholder matches '{name}'"}), 404
+    return jsonify({'shareholder_id': holder_id, 'shareholder_name': index.display_name(holder_id)})
+
+@routes.route('/api/shareholders/<holder_id>/history', methods=['GET'])
+def get_shareholder_history(holder_id):
+    index = current_dataset().derived('shareholder_index', build_shareholder_index)
+    history = index.history(holder_id)
+    if history is None:
+        return jsonify({'error': f'Shareholder {holder_id} not found'}), 404
+    return json_response(history)
+
+def _optional_number(params, name, cast=float):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"Parameter '{name}' must be a number")
+
+@routes.route('/api/right-issues', methods=['GET'])
 def get_right_issues():
     try:
-        # Read the right issues CSV file
-        file_path = DATA_DIR / 'right_issues.csv'
-        if not file_path.exists():
-            logger.error(f"Right issues data file not found: {file_path}")
+        dataset = current_dataset()
+        index = dataset.derived('right_issue_index', build_right_issue_index)
+        if index is None:
+            logger.error(f"Right issues data file not found in {current_app.config['DATA_DIR']}")
             return jsonify({'error': 'Right issues data not found'}), 404
 
-        df = pd.read_csv(file_path)
-        # Convert NaN to None for all fields
-        df = df.where(pd.notna(df), None)
-        data = df.to_dict('records')
-        return jsonify(data)
+        params = request.args
+        filters = ('year', 'year_from', 'year_to', 'min_price', 'max_price', 'fields', 'limit', 'cursor')
+        if not any(name in params for name in filters):
+            return cached_response(dataset, 'right_issues_records', build_right_issue_records)
+
+        try:
+            year = _optional_number(params, 'year', int)
+            year_from = year if year is not None else _optional_number(params, 'year_from', int)
+            year_to = year if year is not None else _optional_number(params, 'year_to', int)
+            min_price = _optional_number(params, 'min_price')
+            max_price = _optional_number(params, 'max_price')
+            limit = _optional_number(params, 'limit', int)
+            if limit is not None and limit < 1:
+                raise ValueError(f"Parameter 'limit' must be between 1 and {MAX_PAGE_SIZE}")
+            fields = [f for f in params.get('fields', '').split(',') if f] or None
+            # A cursor is only valid for the company and filters it was issued for
+            scope = cursor_scope(dataset.company, year_from, year_to, min_price, max_price, fields)
+            offset = decode_cursor(params['cursor'], dataset.version, scope) if params.get('cursor') else 0
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        unknown = [f for f in fields or [] if f not in index.fields]
+        if unknown:
+            return jsonify({'error': f"Unknown field(s): {', '.join(unknown)}"}), 400
+
+        positions = index.select(year_from, year_to, min_price, max_price)
+        if limit is None and 'cursor' not in params:
+            return json_response(index.rows(positions, fields))
+
+        # Paginated: return one page plus a cursor for the next one
+        limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+        page = positions[offset:offset + limit]
+        next_offset = offset + len(page)
+        return json_response({
+            'data': index.rows(page, fields),
+            'total': int(len(positions)),
+            'next_cursor': encode_cursor(dataset.version, next_offset, scope) if next_offset < len(positions) else None,
+        })
     except Exception as e:
         logger.error(f"Error processing right issues data: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/insights', methods=['GET'])
+@routes.route('/api/export/<name>', methods=['GET'])
+def export_data(name):
+    fmt = request.args.get('format', 'csv')
+    if name not in EXPORT_SOURCES:
+        return jsonify({'error': f"Unknown export '{name}', expected one of: {', '.join(EXPORT_SOURCES)}"}), 404
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    options = {}
+    if name == 'financials':
+        try:
+            options['currency'], options['rates'] = requested_currency()
+        except ValueError as e:
+            return currency_error(e)
+    dataset = current_dataset()
+    source = EXPORT_SOURCES[name](dataset, **options)
+    if source is None:
+        return jsonify({'error': f'{name} data not found'}), 404
+    columns, chunks = source
+    return Response(
+        stream_export(columns, chunks, fmt),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={dataset.company}-{name}.{fmt}'},
+    )
+
+@routes.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    try:
+        dataset = current_dataset()
+        try:
+            requested_currency()
+        except ValueError as e:
+            return currency_error(e)
+        with_forecasts = request.args.get('forecast', '').lower() in ('1', 'true', 'yes')
+        name, build = (in_currency('dashboard_forecast', build_dashboard_with_forecasts) if with_forecasts
+                       else in_currency('dashboard', build_dashboard))
+        years = request.args.get('years')
+        if not years:
+            return cached_response(dataset, name, build)
+        try:
+            start, end = parse_year_range(years)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return json_response(filter_dashboard(dataset.derived(name, build), start, end))
+    except Exception as e:
+        logger.error(f"Error building dashboard: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/insights', methods=['GET'])
 def get_insights():
     try:
-        file_path = DATA_DIR / 'financial_metrics.csv'
-        if not file_path.exists():
+        dataset = current_dataset()
+        if dataset.financials_raw is None:
             return jsonify({'error': 'Financial data not found'}), 404
-        df = pd.read_csv(file_path)
-        insights = {
-            "revenue": [],
-            "gross_profit_margin": [],
-            "eps": [],
-            "operating_expenses": [],
-            "cost_of_sales": [],
-            "net_profit": [],
-            "net_asset_per_share": [],
-            "right_issues": [],
-        }
-
-        # Helper for YoY percent
-        def yoy_pct(curr, prev):
-            if prev and prev != 0:
-                return ((curr - prev) / prev) * 100
-            return None
-
-        # Event annotations
-        event_map = {
-            2019: "Easter Sunday Attacks Impact",
-            2020: "COVID-19 Impact",
-            2022: "Tax Changes"
-        }
-
-        for i in range(1, len(df)):
-            prev = df.iloc[i-1]
-            curr = df.iloc[i]
-            year = curr['year']
-            prev_year = prev['year']
-            event = event_map.get(year, None)
-
-            # Revenue
-            prev_revenue = apply_scale(prev['total_revenue_lkr'], prev['total_revenue_lkr_scale'])
-            curr_revenue = apply_scale(curr['total_revenue_lkr'], curr['total_revenue_lkr_scale'])
-            rev_yoy = yoy_pct(curr_revenue, prev_revenue)
-            if curr_revenue < prev_revenue:
-                msg = f"Total revenue declined {abs(rev_yoy):.1f}% from {int(prev_revenue):,} Mn in {prev_year} to {int(curr_revenue):,} Mn in {year}."
-            else:
-                msg = f"Total revenue increased {rev_yoy:.1f}% from {int(prev_revenue):,} Mn in {prev_year} to {int(curr_revenue):,} Mn in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["revenue"].append(msg)
-
-            # Gross profit margin
-            prev_gpm = prev['gross_profit_margin']
-            curr_gpm = curr['gross_profit_margin']
-            gpm_yoy = yoy_pct(curr_gpm, prev_gpm)
-            if abs(curr_gpm - prev_gpm) > 5:
-                direction = "increased" if curr_gpm > prev_gpm else "decreased"
-                msg = f"Gross profit margin {direction} significantly ({prev_gpm:.2f}% to {curr_gpm:.2f}%) from {prev_year} to {year} ({gpm_yoy:+.1f}%)."
-                if event:
-                    msg += f" ({event})"
-                insights["gross_profit_margin"].append(msg)
-
-            # EPS
-            prev_eps = apply_scale(prev['eps_lkr'], prev['eps_lkr_scale'])
-            curr_eps = apply_scale(curr['eps_lkr'], curr['eps_lkr_scale'])
-            eps_yoy = yoy_pct(curr_eps, prev_eps)
-            if curr_eps < prev_eps:
-                msg = f"EPS dropped {abs(eps_yoy):.1f}% from {prev_eps:.2f} in {prev_year} to {curr_eps:.2f} in {year}."
-            else:
-                msg = f"EPS rose {eps_yoy:.1f}% from {prev_eps:.2f} in {prev_year} to {curr_eps:.2f} in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["eps"].append(msg)
-
-            # Operating Expenses
-            prev_opex = apply_scale(prev['operating_expenses_lkr'], prev['operating_expenses_lkr_scale'])
-            curr_opex = apply_scale(curr['operating_expenses_lkr'], curr['operating_expenses_lkr_scale'])
-            opex_yoy = yoy_pct(curr_opex, prev_opex)
-            if curr_opex < prev_opex:
-                msg = f"Operating expenses decreased {abs(opex_yoy):.1f}% from {int(prev_opex):,} Mn in {prev_year} to {int(curr_opex):,} Mn in {year}."
-            else:
-                msg = f"Operating expenses increased {opex_yoy:.1f}% from {int(prev_opex):,} Mn in {prev_year} to {int(curr_opex):,} Mn in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["operating_expenses"].append(msg)
-
-            # Cost of Sales
-            prev_cost = apply_scale(prev['cost_of_sales_lkr'], prev['cost_of_sales_lkr_scale'])
-            curr_cost = apply_scale(curr['cost_of_sales_lkr'], curr['cost_of_sales_lkr_scale'])
-            cost_yoy = yoy_pct(curr_cost, prev_cost)
-            if curr_cost < prev_cost:
-                msg = f"Cost of sales decreased {abs(cost_yoy):.1f}% from {int(prev_cost):,} Mn in {prev_year} to {int(curr_cost):,} Mn in {year}."
-            else:
-                msg = f"Cost of sales increased {cost_yoy:.1f}% from {int(prev_cost):,} Mn in {prev_year} to {int(curr_cost):,} Mn in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["cost_of_sales"].append(msg)
-
-            # Net Profit
-            prev_np = apply_scale(prev['net_profit_lkr'], prev['net_profit_lkr_scale'])
-            curr_np = apply_scale(curr['net_profit_lkr'], curr['net_profit_lkr_scale'])
-            np_yoy = yoy_pct(curr_np, prev_np)
-            if curr_np < prev_np:
-                msg = f"Net profit dropped {abs(np_yoy):.1f}% from {int(prev_np):,} Mn in {prev_year} to {int(curr_np):,} Mn in {year}."
-            else:
-                msg = f"Net profit rose {np_yoy:.1f}% from {int(prev_np):,} Mn in {prev_year} to {int(curr_np):,} Mn in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["net_profit"].append(msg)
-
-            # Net Asset Per Share
-            prev_naps = apply_scale(prev['net_asset_per_share_lkr'], prev['net_asset_per_share_lkr_scale'])
-            curr_naps = apply_scale(curr['net_asset_per_share_lkr'], curr['net_asset_per_share_lkr_scale'])
-            naps_yoy = yoy_pct(curr_naps, prev_naps)
-            if curr_naps < prev_naps:
-                msg = f"Net asset per share declined {abs(naps_yoy):.1f}% from {prev_naps:.2f} in {prev_year} to {curr_naps:.2f} in {year}."
-            else:
-                msg = f"Net asset per share increased {naps_yoy:.1f}% from {prev_naps:.2f} in {prev_year} to {curr_naps:.2f} in {year}."
-            if event:
-                msg += f" ({event})"
-            insights["net_asset_per_share"].append(msg)
-
-        # Right Issues Insights
-        right_issues_path = DATA_DIR / 'right_issues.csv'
-        if right_issues_path.exists():
-            df_ri = pd.read_csv(right_issues_path)
-            # Group by year, summarize significant issues
-            for year, group in df_ri.groupby('year'):
-                issues = group.dropna(subset=['issue_price'])
-                if not issues.empty:
-                    prices = issues['issue_price'].dropna().tolist()
-                    if prices:
-                        avg_price = sum(prices) / len(prices)
-                        msg = f"Right issues in {year}: {len(prices)} issues, average price LKR {avg_price:.2f}."
-                        insights["right_issues"].append(msg)
-
-        return jsonify(insights)
+        return cached_response(dataset, 'insights', build_insights)
     except Exception as e:
         logger.error(f"Error generating insights: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/forecast', methods=['GET'])
+def load_forecast_frame(metrics):
+    """Return (normalized frame in the requested currency, restricted to `metrics`, None), or (None, error response)."""
+    try:
+        currency, rates = requested_currency()
+    except ValueError as e:
+        return None, currency_error(e)
+    frame = financials_in(current_dataset(), currency, rates)
+    if frame is None:
+        return None, (jsonify({'error': 'Financial data not found'}), 404)
+    unknown = [metric for metric in metrics if metric not in frame.columns or metric == 'year']
+    if unknown:
+        return None, (jsonify({'error': f"Unknown metric(s): {', '.join(unknown)}"}), 400)
+    return frame[['year'] + list(metrics)], None
+
+def load_forecast_series(metric):
+    """Return (frame, None) with the non-null yearly values of `metric`, or (None, error response)."""
+    frame, error = load_forecast_frame([metric])
+    if error:
+        return None, error
+    frame = frame.dropna()
+    if frame.empty:
+        return None, (jsonify({'error': 'No valid data for forecasting'}), 400)
+    return frame, None
+
+def parse_forecast_params(params):
+    """
+    Return (metric, periods, engine, None), or an error response as the last
+    item. `periods` is clamped to MIN_PERIODS..MAX_PERIODS.
+    """
+    metric = params.get('metric', 'total_revenue_lkr')
+    engine = params.get('engine', DEFAULT_ENGINE)
+    try:
+        periods = min(max(int(params.get('periods', 3)), MIN_PERIODS), MAX_PERIODS)
+    except (TypeError, ValueError):
+        return metric, None, engine, (jsonify({'error': "Parameter 'periods' must be a whole number"}), 400)
+    if engine not in ENGINES:
+        return metric, periods, engine, (jsonify({'error': f"Unknown engine '{engine}', expected one of: {', '.join(ENGINES)}"}), 400)
+    return metric, periods, engine, None
+
+def forecast_data_version():
+    """Key under which identical forecast jobs are shared: company, data version, currency and rates."""
+    dataset = current_dataset()
+    return f'{dataset.company}@{dataset.version}/{g.currency}@{g.rates.version}'
+
+def forecast_job_state(job_id):
+    state = forecast_jobs.status(job_id)
+    state['url'] = f'/api/forecast/jobs/{job_id}'
+    return state
+
+def queue_forecast_job(frame, metric, periods, engine):
+    """Submit a fit to the forecast pool: 202 with the job and its url, or 503 when the queue is full."""
+    try:
+        job_id = forecast_jobs.submit(frame, metric, periods, engine, forecast_data_version())
+    except forecast_jobs.QueueFullError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    return jsonify(forecast_job_state(job_id)), 202
+
+@routes.route('/api/forecast', methods=['GET'])
 def get_forecast():
     try:
-        metric = request.args.get('metric', 'total_revenue_lkr')
-        periods = int(request.args.get('periods', 3))
-        file_path = DATA_DIR / 'financial_metrics.csv'
-        if not file_path.exists():
-            return jsonify({'error': 'Financial data not found'}), 404
-        
-        df = pd.read_csv(file_path)
-        
-        # Process the data with scaling
-        processed_data = []
-        for _, row in df.iterrows():
-            value = apply_scale(row[metric], row[f'{metric}_scale'])
-            if value is not None:
-                processed_data.append({
-                    'year': int(row['year']),
-                    'value': value
-                })
-        
-        if not processed_data:
-            return jsonify({'error': 'No valid data for forecasting'}), 400
-        
-        # Create DataFrame for Prophet
-        df_prophet = pd.DataFrame(processed_data)
-        df_prophet = df_prophet.rename(columns={'year': 'ds', 'value': 'y'})
-        df_prophet['ds'] = pd.to_datetime(df_prophet['ds'], format='%Y')
-        
-        # Fit Prophet model
-        model = Prophet(yearly_seasonality=True, daily_seasonality=False, weekly_seasonality=False)
-        model.fit(df_prophet)
-        
-        # Make future predictions
-        future = model.make_future_dataframe(periods=periods, freq='Y')
-        forecast = model.predict(future)
-        
-        # Build response
-        last_year = df['year'].max()
-        result = []
-        for _, row in forecast.iterrows():
-            year = int(row['ds'].year)
-            if year <= last_year:
-                result.append({'year': year, 'forecast': None})
-            else:
-                result.append({'year': year, 'forecast': max(0, float(row['yhat']))})
-        
-        return jsonify(result)
+        metric, periods, engine, error = parse_forecast_params(request.args)
+        if error:
+            return error
+        frame, error = load_forecast_series(metric)
+        if error:
+            return error
+        if engine not in FAST_ENGINES:
+            # Never fit Stan in a request thread; poll the job instead
+            return queue_forecast_job(frame, metric, periods, engine)
+        return json_response(forecast_response(frame, metric, periods=periods, engine=engine))
     except Exception as e:
         logger.error(f"Error generating forecast: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@routes.route('/api/forecast/batch', methods=['GET'])
+def get_forecast_batch():
+    try:
+        _, periods, engine, error = parse_forecast_params(request.args)
+        if error:
+            return error
+        metrics = request.args.get('metrics', '')
+        metrics = list(dict.fromkeys(m.strip() for m in metrics.split(',') if m.strip())) or DASHBOARD_FORECAST_METRICS
+        frame, error = load_forecast_frame(metrics)
+        if error:
+            return error
+        if engine in FAST_ENGINES:
+            return json_response(forecast_batch_response(frame, metrics, periods, engine))
+        # Prophet fits go to the pool as one job per metric; poll each job's url
+        try:
+            job_ids = forecast_jobs.submit_batch(frame, metrics, periods, engine, forecast_data_version())
+        except forecast_jobs.QueueFullError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        return jsonify({'jobs': {metric: forecast_job_state(job_id) for metric, job_id in job_ids.items()}}), 202
+    except Exception as e:
+        logger.error(f"Error generating batch forecast: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/forecast/jobs', methods=['POST'])
+def create_forecast_job():
+    try:
+        metric, periods, engine, error = parse_forecast_params(request.get_json(silent=True) or request.args)
+        if error:
+            return error
+        frame, error = load_forecast_series(metric)
+        if error:
+            return error
+        return queue_forecast_job(frame, metric, periods, engine)
+    except Exception as e:
+        logger.error(f"Error creating forecast job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@routes.route('/api/forecast/jobs/<job_id>', methods=['GET'])
+def get_forecast_job(job_id):
+    try:
+        try:
+            wait = float(request.args.get('wait') or 0)
+        except ValueError:
+            wait = math.nan
+        if not math.isfinite(wait):
+            return jsonify({'error': "Parameter 'wait' must be a number of seconds"}), 400
+        state = forecast_jobs.status(job_id, wait=wait)
+        if state is None:
+            return jsonify({'error': f'Forecast job {job_id} not found'}), 404
+        return jsonify(state)
+    except Exception as e:
+        logger.error(f"Error reading forecast job {job_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app(config_from_env()).run(debug=True)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Offline rolling-origin backtest of the forecast engines behind /api/forecast.
+
+For every metric in financial_metrics.csv and every engine/parameter set, the
+series is cut at each origin, the engine is fitted on the years before the cut
+and scored on the years after it. Tasks are spread over a process pool and the
+report ranks engines by accuracy (MAPE/MASE) against mean fit time.
+
+    python backtest.py --horizon 1 --min-train 3 --workers 4 --output backtest.csv
+"""
+import argparse
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_DIR, load_normalized_financials
+from forecasting import FAST_ENGINES, forecast_matrix, prophet_forecast
+
+logger = logging.getLogger(__name__)
+
+# Parameter grids per engine; each dict is one candidate configuration
+PARAM_GRIDS = {
+    'linear': [{}],
+    'loglinear': [{}],
+    'holt': [
+        {'alpha': alpha, 'beta': beta, 'phi': phi}
+        for alpha, beta, phi in itertools.product([0.5, 0.8], [0.1, 0.3], [0.8, 0.9, 0.98])
+    ],
+    'prophet': [
+        {'changepoint_prior_scale': scale} for scale in [0.05, 0.5]
+    ],
+}
+
+
+def _forecast(engine, params, years, values, horizon):
+    if engine in FAST_ENGINES:
+        _, yhat, _, _ = forecast_matrix(years, values[None, :], horizon, engine, **params)
+        return yhat[0]
+    _, yhat, _, _ = prophet_forecast(years, values, horizon, **params)
+    return yhat[0]
+
+
+def backtest_series(metric, years, values, engine, params, horizon=1, min_train=3):
+    """
+    Rolling-origin evaluation of one engine configuration on one series.
+    Returns a dict of error and timing statistics, or None if the series is too short.
+    """
+    years = np.asarray(years)
+    values = np.asarray(values, dtype=float)
+    keep = ~np.isnan(values)
+    years, values = years[keep], values[keep]
+    if len(values) < min_train + horizon:
+        return None
+
+    abs_errors, pct_errors, scaled_errors, fit_times = [], [], [], []
+    for origin in range(min_train, len(values) - horizon + 1):
+        train_years, train = years[:origin].tolist(), values[:origin]
+        actual = values[origin:origin + horizon]
+        start = time.perf_counter()
+        predicted = _forecast(engine, params, train_years, train, horizon)
+        fit_times.append(time.perf_counter() - start)
+
+        errors = np.abs(actual - predicted)
+        abs_errors.extend(errors)
+        nonzero = actual != 0
+        pct_errors.extend(errors[nonzero] / np.abs(actual[nonzero]))
+        # MASE scales by the in-sample one-step naive error of the training window
+        naive = np.mean(np.abs(np.diff(train))) if len(train) > 1 else 0.0
+        if naive > 0:
+            scaled_errors.extend(errors / naive)
+
+    return {
+        'metric': metric,
+        'engine': engine,
+        'params': ','.join(f'{k}={v}' for k, v in params.items()),
+        'origins': len(fit_times),
+        'mae': float(np.mean(abs_errors)),
+        'mape': float(np.mean(pct_errors) * 100) if pct_errors else np.nan,
+        'mase': float(np.mean(scaled_errors)) if scaled_errors else np.nan,
+        'fit_ms': float(np.mean(fit_times) * 1000),
+    }
+
+
+def _run_task(task):
+    return backtest_series(*task)
+
+
+def run_backtest(frame, engines, horizon=1, min_train=3, workers=None):
+    """Backtest every metric column of `frame` across engines and their parameter grids."""
+    metrics = [column for column in frame.columns if column != 'year']
+    tasks = [
+        (metric, frame['year'].tolist(), frame[metric].to_numpy(dtype=float), engine, params, horizon, min_train)
+        for metric in metrics
+        for engine in engines
+        for params in PARAM_GRIDS[engine]
+    ]
+    logger.info(f"Running {len(tasks)} backtest tasks over {len(metrics)} metrics")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [r for r in executor.map(_run_task, tasks, chunksize=4) if r is not None]
+    return pd.DataFrame(results)
+
+
+def summarize(results):
+    """Aggregate per engine configuration: median errors across metrics and mean fit time."""
+    summary = results.groupby(['engine', 'params'], dropna=False).agg(
+        metrics=('metric', 'count'),
+        mape=('mape', 'median'),
+        mase=('mase', 'median'),
+        fit_ms=('fit_ms', 'mean'),
+    )
+    return summary.sort_values(['mase', 'fit_ms']).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--engines', default=','.join(PARAM_GRIDS), help='comma-separated engines')
+    parser.add_argument('--horizon', type=int, default=1)
+    parser.add_argument('--min-train', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', help='write per-metric results to this CSV')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    engines = [engine for engine in args.engines.split(',') if engine]
+    unknown = [engine for engine in engines if engine not in PARAM_GRIDS]
+    if unknown:
+        parser.error(f"Unknown engine(s): {', '.join(unknown)}")
+
+    frame = load_normalized_financials(args.data_dir)
+    results = run_backtest(frame, engines, args.horizon, args.min_train, args.workers)
+    if results.empty:
+        print('Not enough history for the requested horizon/min-train.')
+        return
+    if args.output:
+        results.to_csv(args.output, index=False)
+    with pd.option_context('display.width', 120, 'display.max_columns', None):
+        print(summarize(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
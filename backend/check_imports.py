@@ -0,0 +1,77 @@
+"""
+Import-time budget check for the API and extractor entry points.
+
+Each module is imported in a fresh interpreter under `python -X importtime`;
+the check fails if its cold import takes longer than its budget or if it
+loads a heavy dependency that must stay deferred until first use.
+
+    python check_imports.py --repeat 3
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+# Module -> (cold import budget in seconds, modules it must not load at import)
+IMPORT_BUDGETS = {
+    'app': (1.0, ('prophet', 'cmdstanpy', 'camelot', 'tabula', 'PyPDF2')),
+    'extract_data': (0.75, ('prophet', 'camelot', 'tabula', 'PyPDF2', 'flask')),
+    'forecasting': (0.6, ('prophet', 'cmdstanpy', 'flask')),
+}
+
+
+def measure(module):
+    """Return (seconds, {direct import: seconds}, loaded module names) for one cold import of `module`."""
+    code = f'import json, sys, {module}; print(json.dumps(sorted(sys.modules)))'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    total, children = 0.0, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Each nesting level indents the name by two more spaces; entries precede their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative) / 1e6
+            break
+        if depth == 1:
+            children[name.strip()] = int(cumulative) / 1e6
+        elif depth == 0:
+            children = {}
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return total, children, loaded
+
+
+def check(module, budget, forbidden, repeat=1, top=5):
+    """Print the import profile of `module`; return True if it is within budget."""
+    runs = [measure(module) for _ in range(repeat)]
+    seconds, children, loaded = min(runs, key=lambda run: run[0])
+    eager = [name for name in forbidden if name in loaded]
+    ok = seconds <= budget and not eager
+    print(f"{'ok  ' if ok else 'FAIL'} {module}: {seconds:.3f}s (budget {budget:.2f}s)")
+    for name, cost in sorted(children.items(), key=lambda item: -item[1])[:top]:
+        print(f"       {cost:7.3f}s  {name}")
+    if eager:
+        print(f"       loaded at import: {', '.join(eager)}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check cold import times against their budgets.')
+    parser.add_argument('modules', nargs='*', default=list(IMPORT_BUDGETS))
+    parser.add_argument('--repeat', type=int, default=3, help='imports per module; the fastest counts')
+    args = parser.parse_args()
+    results = [check(module, *IMPORT_BUDGETS[module], repeat=args.repeat) for module in args.modules]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
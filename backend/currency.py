@@ -0,0 +1,199 @@
+"""
+Exchange-rate table and conversion of the financial metrics into other currencies.
+
+Monetary metrics are stored once, in LKR (the *_lkr columns). Values in any
+other currency are computed from them when requested, one vectorized division
+by the yearly rate, and cached on the Dataset per currency and rate version.
+The rates live in data_cleaned/rates/exchange_rates.csv (year, currency,
+lkr_per_unit); its version is a hash of its contents, so correcting a rate
+takes effect on the next request without re-extracting or republishing data.
+
+List the rates, or set one, with:
+    python currency.py --set USD 2023 322.77
+"""
+import argparse
+import hashlib
+import io
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_DIR, FINANCIAL_METRICS, frame_records
+
+logger = logging.getLogger(__name__)
+
+RATES_FILE = DATA_DIR / 'rates' / 'exchange_rates.csv'
+# Currency the *_lkr metrics are stored in
+BASE_CURRENCY = 'LKR'
+# Currency added beside LKR when a request names none, as the dashboard expects
+DEFAULT_CURRENCY = 'USD'
+BASE_SUFFIX = '_lkr'
+
+_tables = {}       # path -> ((inode, mtime_ns, size), RateTable)
+_lock = threading.Lock()
+
+
+class RateTable:
+    """LKR per unit of each currency by year, with the version of the file it was read from."""
+
+    def __init__(self, frame, version):
+        self.frame = frame
+        self.version = version
+        self._by_currency = {
+            currency: group.set_index('year')['lkr_per_unit']
+            for currency, group in frame.groupby('currency')
+        }
+
+    @property
+    def currencies(self):
+        return sorted(self._by_currency)
+
+    def supports(self, currency):
+        return currency == BASE_CURRENCY or currency in self._by_currency
+
+    def per_unit(self, currency, years):
+        """LKR per unit of `currency` for each of `years` as a float array, NaN where no rate is recorded."""
+        rates = self._by_currency.get(currency)
+        if rates is None:
+            return np.full(len(years), np.nan)
+        return rates.reindex(np.asarray(years)).to_numpy(dtype=float)
+
+    def records(self):
+        return frame_records(self.frame)
+
+
+def parse_rates(text):
+    """RateTable from the CSV text of a rate file. Raises ValueError for a malformed one."""
+    frame = pd.read_csv(io.StringIO(text))
+    missing = {'year', 'currency', 'lkr_per_unit'} - set(frame.columns)
+    if missing:
+        raise ValueError(f"Rate file is missing column(s): {', '.join(sorted(missing))}")
+    frame = frame[['year', 'currency', 'lkr_per_unit']].astype({'year': int, 'lkr_per_unit': float})
+    frame['currency'] = frame['currency'].str.strip().str.upper()
+    if (frame['lkr_per_unit'] <= 0).any():
+        raise ValueError('Exchange rates must be positive')
+    if frame.duplicated(['year', 'currency']).any():
+        raise ValueError('Rate file lists a currency twice for the same year')
+    frame = frame.sort_values(['currency', 'year']).reset_index(drop=True)
+    return RateTable(frame, hashlib.sha1(text.encode()).hexdigest()[:12])
+
+
+def load_rates(path=RATES_FILE):
+    """
+    The RateTable in `path`, re-read only when the file is replaced or its size
+    or mtime changes. An unreadable or malformed file keeps the previous table
+    in service; with no file at all, or an invalid one and no previous table,
+    only LKR is available.
+    """
+    path = Path(path)
+    try:
+        stat = path.stat()
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return _empty_table('none')
+    with _lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            table = parse_rates(path.read_text())
+        except Exception as e:
+            table = cached[1] if cached is not None else _empty_table('invalid')
+            logger.error(f"Using exchange rates {table.version}, {path} is invalid: {e}")
+        # Remembered under the new signature too, so an invalid file is reported once per change
+        _tables[path] = (signature, table)
+        return table
+
+
+def _empty_table(version):
+    return RateTable(pd.DataFrame(columns=['year', 'currency', 'lkr_per_unit']), version)
+
+
+def default_currency(rates):
+    """DEFAULT_CURRENCY, or LKR alone when the rate table has no DEFAULT_CURRENCY rates."""
+    return DEFAULT_CURRENCY if rates.supports(DEFAULT_CURRENCY) else BASE_CURRENCY
+
+
+def converted_name(metric, currency):
+    """'total_revenue_usd' for 'total_revenue_lkr' in USD."""
+    return f'{metric[:-len(BASE_SUFFIX)]}_{currency.lower()}'
+
+
+def metric_columns(currency=DEFAULT_CURRENCY):
+    """FINANCIAL_METRICS with each LKR metric followed by its value in `currency`."""
+    columns = []
+    for metric in FINANCIAL_METRICS:
+        columns.append(metric)
+        if metric.endswith(BASE_SUFFIX) and currency != BASE_CURRENCY:
+            columns.append(converted_name(metric, currency))
+    return columns
+
+
+def convert_financials(frame, currency, rates):
+    """`frame` with a <metric>_<currency> column added for every *_lkr metric, computed in one pass."""
+    lkr = [column for column in frame.columns if column.endswith(BASE_SUFFIX)]
+    targets = [converted_name(column, currency) for column in lkr]
+    per_unit = rates.per_unit(currency, frame['year'].to_numpy())
+    converted = frame[lkr].to_numpy(dtype=float) / per_unit[:, None]
+    # Columns an older extraction stored in this currency are replaced by the computed ones
+    base = frame.drop(columns=targets, errors='ignore')
+    return pd.concat([base, pd.DataFrame(converted, columns=targets, index=frame.index)], axis=1)
+
+
+def cache_name(name, currency, rates):
+    """Name under which a Dataset caches `name` in `currency` at the rate version of `rates`."""
+    if currency == BASE_CURRENCY:
+        return f'{name}:{currency}'
+    return f'{name}:{currency}:{(rates or load_rates()).version}'
+
+
+def financials_in(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    """dataset.financials with the LKR metrics also in `currency`, built once per currency and rate version."""
+    frame = dataset.financials
+    if frame is None or currency == BASE_CURRENCY:
+        return frame
+    rates = rates or load_rates()
+    return dataset.derived(cache_name('financials', currency, rates),
+                           lambda ds: convert_financials(ds.financials, currency, rates))
+
+
+def build_financial_records(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    """/api/financials rows: year plus every metric, scaled to absolute terms, in LKR and `currency`."""
+    frame = financials_in(dataset, currency, rates).reindex(columns=['year'] + metric_columns(currency))
+    return frame_records(frame)
+
+
+def set_rate(path, currency, year, lkr_per_unit):
+    """Record (or correct) one rate in the file at `path`, replacing it atomically."""
+    from publish import atomic_write_text
+
+    path = Path(path)
+    frame = load_rates(path).frame if path.exists() else pd.DataFrame(columns=['year', 'currency', 'lkr_per_unit'])
+    currency = currency.upper()
+    frame = frame[~((frame['currency'] == currency) & (frame['year'] == year))]
+    frame = pd.concat([frame, pd.DataFrame([{'year': year, 'currency': currency, 'lkr_per_unit': lkr_per_unit}])])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(path, frame.sort_values(['year', 'currency']).to_csv(index=False))
+    return load_rates(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or correct the exchange rates applied to the LKR metrics.')
+    parser.add_argument('--rates', default=str(RATES_FILE))
+    parser.add_argument('--set', nargs=3, metavar=('CURRENCY', 'YEAR', 'LKR_PER_UNIT'),
+                        help='record the rate of CURRENCY for YEAR')
+    args = parser.parse_args()
+    if args.set:
+        currency, year, rate = args.set
+        rates = set_rate(args.rates, currency, int(year), float(rate))
+    else:
+        rates = load_rates(args.rates)
+    print(f'version {rates.version}')
+    print(rates.frame.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
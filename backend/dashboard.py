@@ -0,0 +1,65 @@
+from currency import DEFAULT_CURRENCY, build_financial_records, cache_name
+from dataset import in_year_range
+from forecasting import DEFAULT_ENGINE, forecast_batch_response
+from insights import build_insights
+from right_issues import build_right_issue_summary
+from shareholders import build_shareholders_by_year
+
+# Metrics charted on the dashboard, forecast when no others are requested
+DASHBOARD_FORECAST_METRICS = [
+    'total_revenue_lkr', 'eps_lkr', 'net_profit_lkr', 'operating_expenses_lkr', 'cost_of_sales_lkr'
+]
+
+
+def build_dashboard(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    """
+    Everything the dashboard's first render needs, built from the cached parts
+    of one Dataset, with the LKR metrics also in `currency`.
+    """
+    by_year = dataset.derived('shareholders_by_year', build_shareholders_by_year)
+    latest_year = list(by_year)[-1] if by_year else None
+    financials = []
+    if dataset.financials is not None:
+        financials = dataset.derived(cache_name('financials_records', currency, rates),
+                                     lambda ds: build_financial_records(ds, currency, rates))
+    return {
+        'company': dataset.company,
+        'version': dataset.version,
+        'currency': currency,
+        'years': [row['year'] for row in financials],
+        'financials': financials,
+        'insights': dataset.derived('insights', build_insights) if dataset.financials is not None else {},
+        'right_issues': dataset.derived('right_issue_summary', build_right_issue_summary),
+        'shareholders': {'fiscal_year': latest_year, 'rows': by_year.get(latest_year, [])},
+    }
+
+
+def build_dashboard_forecasts(dataset):
+    """Closed-form forecasts of the dashboard metrics with the default engine."""
+    frame = dataset.financials
+    if frame is None:
+        return {}
+    metrics = [metric for metric in DASHBOARD_FORECAST_METRICS if metric in frame.columns]
+    return forecast_batch_response(frame[['year'] + metrics], metrics, engine=DEFAULT_ENGINE)
+
+
+def build_dashboard_with_forecasts(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    dashboard = dataset.derived(cache_name('dashboard', currency, rates),
+                                lambda ds: build_dashboard(ds, currency, rates))
+    return {**dashboard,
+            'forecasts': dataset.derived('dashboard_forecasts', build_dashboard_forecasts)}
+
+
+def filter_dashboard(payload, start, end):
+    """Restrict the year-keyed parts of a dashboard payload to the inclusive range [start, end]."""
+    filtered = dict(payload)
+    filtered['financials'] = [row for row in payload['financials'] if in_year_range(row['year'], start, end)]
+    filtered['years'] = [row['year'] for row in filtered['financials']]
+    filtered['right_issues'] = [row for row in payload['right_issues'] if in_year_range(row['year'], start, end)]
+    if 'forecasts' in payload:
+        # Keep every forecast year; trim only the historical rows
+        filtered['forecasts'] = {
+            metric: [row for row in rows if row['forecast'] is not None or in_year_range(row['year'], start, end)]
+            for metric, rows in payload['forecasts'].items()
+        }
+    return filtered
@@ -0,0 +1,479 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+import snapshot
+import storage
+from metrics import DATASET_BUILD, DATASET_EVICTIONS, DATASET_LOAD, cache_lookup
+
+DATA_DIR = Path(__file__).parent / 'data_cleaned'
+FINANCIALS_FILE = 'financial_metrics.csv'
+RIGHT_ISSUES_FILE = 'right_issues.csv'
+SHAREHOLDERS_PREFIX = 'shareholders_'
+# Written last by publish.py; when present its version is authoritative
+MANIFEST_FILE = 'manifest.json'
+# Seconds between checks for a newly published data version
+RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', 2))
+# Company whose reports populate data_cleaned; other companies are served from the store and snapshots
+DEFAULT_COMPANY = 'JKH'
+# Memory budget for the Datasets of companies other than DEFAULT_COMPANY, least recently used evicted first
+COMPANY_CACHE_BYTES = int(os.environ.get('COMPANY_CACHE_BYTES', 512 * 1024 * 1024))
+
+# Stored metric columns, each with a <metric>_scale column; monetary ones are in LKR and
+# served in other currencies by currency.py
+FINANCIAL_METRICS = [
+    'total_revenue_lkr',
+    'eps_lkr',
+    'share_count',
+    'net_profit_lkr',
+    'operating_expenses_lkr',
+    'net_asset_per_share_lkr',
+    'gross_profit_margin',
+    'cost_of_sales_lkr'
+]
+
+
+def apply_scale(value, scale):
+    if pd.isna(value) or pd.isna(scale):
+        return None
+    value = float(value)
+    if scale == 'K':
+        return value * 1000
+    elif scale == 'Mn':
+        return value * 1000000
+    return value
+
+
+SCALE_MULTIPLIERS = {'K': 1000, 'Mn': 1000000}
+
+
+def normalize_financials(df):
+    """Return a frame with 'year' and every metric column scaled to absolute values."""
+    out = pd.DataFrame({'year': df['year'].astype(int)})
+    for column in df.columns:
+        scale_column = f'{column}_scale'
+        if scale_column not in df.columns:
+            continue
+        multiplier = df[scale_column].map(SCALE_MULTIPLIERS).fillna(1)
+        values = pd.to_numeric(df[column], errors='coerce') * multiplier
+        out[column] = values.where(df[scale_column].notna())
+    return out
+
+
+def denormalize_financials(frame, scales):
+    """Inverse of normalize_financials: values in their reported scale beside '<metric>_scale' columns."""
+    scales = frame[['year']].merge(scales, on='year', how='left')
+    out = pd.DataFrame({'year': frame['year']})
+    for column in frame.columns:
+        scale_column = f'{column}_scale'
+        if scale_column not in scales.columns:
+            continue
+        out[column] = frame[column] / scales[scale_column].map(SCALE_MULTIPLIERS).fillna(1).to_numpy()
+        out[scale_column] = scales[scale_column].to_numpy()
+    return out
+
+
+def frame_records(df):
+    """DataFrame rows as dicts with NaN mapped to None."""
+    return df.astype(object).where(pd.notna(df), None).to_dict('records')
+
+
+def parse_year_range(text):
+    """
+    Parse '2020-2023', '2021', '2020-' or '-2022' into an inclusive (start, end)
+    pair, either end None when open. Raises ValueError for anything else.
+    """
+    start, sep, end = str(text).strip().partition('-')
+    try:
+        start = int(start) if start else None
+        end = (int(end) if end else None) if sep else start
+    except ValueError:
+        raise ValueError(f"Invalid year range '{text}', expected e.g. 2020-2023")
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"Invalid year range '{text}': start is after end")
+    return start, end
+
+
+def in_year_range(year, start, end):
+    return (start is None or year >= start) and (end is None or year <= end)
+
+
+def load_normalized_financials(data_dir=DATA_DIR):
+    """Read financial_metrics.csv from `data_dir` and return it normalized, sorted by year."""
+    df = pd.read_csv(Path(data_dir) / FINANCIALS_FILE)
+    return normalize_financials(df).sort_values('year').reset_index(drop=True)
+
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(data_dir=DATA_DIR):
+    """Hash of the cleaned data files' names, mtimes and sizes; changes whenever any of them is rewritten."""
+    entries = []
+    data_dir = Path(data_dir)
+    paths = (sorted(data_dir.glob('*.csv')) + sorted(data_dir.glob(storage.STORE_FILE))
+             + sorted(data_dir.glob(f'{snapshot.SNAPSHOT_DIR}/*/*.arrow')))
+    for path in paths:
+        stat = path.stat()
+        entries.append(f'{path.name}:{stat.st_mtime_ns}:{stat.st_size}')
+    return hashlib.sha1('|'.join(entries).encode()).hexdigest()[:16]
+
+
+def data_version(data_dir=DATA_DIR):
+    """
+    Version of the data in `data_dir`: the one recorded in manifest.json once
+    publish.py has published there, otherwise the fingerprint of the files.
+    """
+    manifest = Path(data_dir) / MANIFEST_FILE
+    if manifest.exists():
+        return json.loads(manifest.read_text())['version']
+    return fingerprint(data_dir)
+
+
+# Where a Dataset looks for its data, in order of preference
+DATA_SOURCES = ('snapshot', 'store', 'csv')
+# Sequences longer than this are sized from a sample of their items
+SIZE_SAMPLE = 100
+
+
+def estimate_size(value, _depth=0):
+    """Approximate bytes held by a frame, encoded response, index object or nested container."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, (bytes, str)) or _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        items = list(value.items())
+        sample = items[:SIZE_SAMPLE]
+        sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        sample = items[:SIZE_SAMPLE]
+        sampled = sum(estimate_size(v, _depth + 1) for v in sample)
+    elif hasattr(value, '__dict__'):
+        return size + estimate_size(vars(value), _depth + 1)
+    else:
+        return size
+    return size + (sampled * len(items) // len(sample) if sample else 0)
+
+
+class Dataset:
+    """
+    One version of the cleaned data. Frames are read on first use and anything
+    derived from them is built once through `derived` and reused until the
+    files change and a new Dataset replaces this one.
+    """
+
+    def __init__(self, data_dir, version, company=DEFAULT_COMPANY, sources=DATA_SOURCES):
+        self.data_dir = Path(data_dir)
+        self.version = version
+        self.company = company
+        # The CSVs only ever hold DEFAULT_COMPANY's data
+        self.sources = sources if company == DEFAULT_COMPANY else tuple(s for s in sources if s != 'csv')
+        self.nbytes = 0     # estimated size of everything built so far
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derived(self, name, builder):
+        """Return the cached result of `builder(self)`, building it on first use."""
+        cache = 'response' if name.startswith('response:') else 'dataset'
+        try:
+            value = self._derived[name]
+            cache_lookup(cache, True)
+            return value
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                cache_lookup(cache, False)
+                started = time.perf_counter()
+                value = builder(self)
+                self._derived[name] = value
+                self.nbytes += estimate_size(value)
+                # Response keys carry shape and coding; one series per payload is enough
+                DATASET_BUILD.labels(':'.join(name.split(':')[:2])).observe(time.perf_counter() - started)
+            return self._derived[name]
+
+    def path(self, filename):
+        return self.data_dir / filename
+
+    @property
+    def snapshot(self):
+        """Directory of the memory-mapped Arrow snapshot (see snapshot.py) when usable, else None."""
+        if 'snapshot' not in self.sources or not snapshot.has_snapshot(self.data_dir, self.company):
+            return None
+        return snapshot.snapshot_dir(self.data_dir, self.company)
+
+    @property
+    def source(self):
+        """'snapshot', 'store' or 'csv': where this Dataset reads its frames from."""
+        if self.snapshot is not None:
+            return 'snapshot'
+        return 'store' if self.store is not None else 'csv'
+
+    @property
+    def store(self):
+        """Path of the SQLite store (see storage.py) when data_dir has one; it then replaces the CSVs."""
+        path = self.path(storage.STORE_FILE)
+        return path if 'store' in self.sources and path.exists() else None
+
+    def _read_csv(self, filename):
+        path = self.path(filename)
+        return pd.read_csv(path) if path.exists() else None
+
+    @property
+    def financials_raw(self):
+        """Financial metrics as reported (value and scale columns), or None if missing."""
+        def build(ds):
+            if ds.snapshot is None and ds.store is None:
+                return ds._read_csv(FINANCIALS_FILE)
+            if ds.financials is None:
+                return None
+            if ds.snapshot is not None:
+                scales = snapshot.read_financial_scales(ds.snapshot)
+            else:
+                scales = storage.read_financial_scales(ds.store, ds.company)
+            return denormalize_financials(ds.financials, scales)
+        return self.derived('financials_raw', build)
+
+    @property
+    def financials(self):
+        """Financial metrics scaled to absolute values, sorted by year, or None if missing."""
+        def build(ds):
+            if ds.snapshot is not None:
+                return snapshot.read_financials(ds.snapshot)
+            if ds.store is not None:
+                frame = storage.read_financials(ds.store, ds.company)
+                return None if frame.empty else frame
+            raw = ds.financials_raw
+            if raw is None:
+                return None
+            return normalize_financials(raw).sort_values('year').reset_index(drop=True)
+        return self.derived('financials', build)
+
+    @property
+    def right_issues(self):
+        """Right issues (year, ratio, issue_price), or None if missing."""
+        def build(ds):
+            if ds.snapshot is not None:
+                return snapshot.read_right_issues(ds.snapshot)
+            if ds.store is not None:
+                return storage.read_right_issues(ds.store, ds.company)
+            return ds._read_csv(RIGHT_ISSUES_FILE)
+        return self.derived('right_issues', build)
+
+    @property
+    def shareholders(self):
+        """{fiscal_year: frame} for every fiscal year with a shareholder list, oldest year first."""
+        def build(ds):
+            if ds.snapshot is not None:
+                return snapshot.read_shareholders(ds.snapshot)
+            if ds.store is not None:
+                return storage.read_shareholders(ds.store, ds.company)
+            paths = sorted(ds.data_dir.glob(f'{SHAREHOLDERS_PREFIX}*.csv'))
+            return {path.stem[len(SHAREHOLDERS_PREFIX):]: pd.read_csv(path) for path in paths}
+        return self.derived('shareholders', build)
+
+
+class DatasetCache:
+    """
+    Datasets keyed by (data_dir, company), loaded on first access. Once their
+    estimated total size passes `max_bytes`, the least recently used are
+    evicted; the one just requested always stays.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._loading = {}      # key -> lock held while that Dataset is created
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return sum(dataset.nbytes for dataset in list(self._entries.values()))
+
+    def _evict(self, keep):
+        """Drop least recently used entries until the rest fit. Caller holds the lock."""
+        total = sum(dataset.nbytes for dataset in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                total -= self._entries.pop(key).nbytes
+                DATASET_EVICTIONS.inc()
+
+    def get(self, key, version, load):
+        """The cached Dataset for `key` at `version`, or `load()`'s result, cached."""
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is not None and dataset.version == version:
+                self._entries.move_to_end(key)
+                # Datasets grow as their derived results are built, so the budget is rechecked on every access
+                self._evict(keep=key)
+                cache_lookup('company', True)
+                return dataset
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                dataset = self._entries.get(key)
+                if dataset is not None and dataset.version == version:
+                    return dataset
+            cache_lookup('company', False)
+            dataset = load()
+            with self._lock:
+                # Entries of older versions of the same directory will never be asked for again
+                for stale in [k for k, d in self._entries.items() if k[0] == key[0] and d.version != version]:
+                    del self._entries[stale]
+                self._entries[key] = dataset
+                self._evict(keep=key)
+                self._loading.pop(key, None)
+            return dataset
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._loading = {}
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+_watched = {}   # data_dir -> (warm, interval) for directories kept current by a reloader thread
+_company_datasets = DatasetCache(COMPANY_CACHE_BYTES)
+
+
+def configure_company_cache(max_bytes=None):
+    """Change the memory budget of the per-company Dataset cache."""
+    if max_bytes is not None:
+        _company_datasets.max_bytes = int(max_bytes)
+
+
+def get_dataset(data_dir=DATA_DIR, company=None):
+    """
+    Return the Dataset for the current version of the files in `data_dir`. A
+    watched directory returns the Dataset last swapped in by its reloader.
+    Companies other than DEFAULT_COMPANY come from a size-bounded LRU and
+    are loaded lazily, on their first request after each new version.
+    """
+    data_dir = Path(data_dir)
+    if data_dir in _watched:
+        current = _datasets[data_dir]
+    else:
+        version = data_version(data_dir)
+        current = _datasets.get(data_dir)
+        if current is None or current.version != version:
+            with _datasets_lock:
+                current = _datasets.get(data_dir)
+                if current is None or current.version != version:
+                    current = Dataset(data_dir, version)
+                    _datasets[data_dir] = current
+    if company is None or company == current.company:
+        return current
+    version = current.version
+    return _company_datasets.get((data_dir, company), version, lambda: Dataset(data_dir, version, company))
+
+
+def build_companies(dataset):
+    """Every company with data in the store or a snapshot of `dataset`'s directory, DEFAULT_COMPANY first."""
+    found = set()
+    if dataset.store is not None:
+        found.update(storage.companies(dataset.store))
+    snapshots = dataset.data_dir / snapshot.SNAPSHOT_DIR
+    if snapshot.PYARROW_AVAILABLE and snapshots.is_dir():
+        found.update(p.name for p in snapshots.iterdir() if snapshot.has_snapshot(dataset.data_dir, p.name))
+    found.discard(DEFAULT_COMPANY)
+    return [DEFAULT_COMPANY] + sorted(found)
+
+
+def resolve_company(data_dir, company):
+    """The listed company matching `company` case-insensitively, or None."""
+    by_name = get_dataset(data_dir).derived(
+        'companies_by_name', lambda ds: {c.upper(): c for c in ds.derived('companies', build_companies)}
+    )
+    return by_name.get(str(company).strip().upper())
+
+
+def load_dataset(data_dir, version, warm=None):
+    """A Dataset with its frames read and, through `warm(dataset)`, anything else requests need built."""
+    started = time.perf_counter()
+    dataset = Dataset(data_dir, version)
+    for frame in ('financials_raw', 'financials', 'right_issues', 'shareholders'):
+        getattr(dataset, frame)
+    if warm is not None:
+        warm(dataset)
+    DATASET_LOAD.labels(dataset.source).observe(time.perf_counter() - started)
+    return dataset
+
+
+def _reload(data_dir, warm, interval):
+    failed = None
+    while True:
+        time.sleep(interval)
+        version = None
+        try:
+            version = data_version(data_dir)
+            if version == _datasets[data_dir].version or version == failed:
+                continue
+            started = time.perf_counter()
+            dataset = load_dataset(data_dir, version, warm)
+            # Readers keep using the old Dataset until this single assignment
+            _datasets[data_dir] = dataset
+            logger.info(f"Swapped in data version {version} ({time.perf_counter() - started:.2f}s to build)")
+        except Exception as e:
+            failed = version
+            logger.error(f"Loading data version {version} from {data_dir} failed, still serving "
+                         f"{_datasets[data_dir].version}: {str(e)}")
+
+
+def watch_dataset(data_dir=DATA_DIR, warm=None, interval=RELOAD_INTERVAL):
+    """
+    Load `data_dir` now, then keep get_dataset(data_dir) current from a daemon
+    thread: new versions are loaded and warmed in the background and swapped in
+    with one assignment, so requests never wait for a reload. A version that
+    fails to load is skipped and the previous one keeps being served.
+    """
+    data_dir = Path(data_dir)
+    with _datasets_lock:
+        if data_dir in _watched:
+            return _datasets[data_dir]
+        _datasets[data_dir] = load_dataset(data_dir, data_version(data_dir), warm)
+        _watched[data_dir] = (warm, interval)
+    _start_reloader(data_dir)
+    return _datasets[data_dir]
+
+
+def _start_reloader(data_dir):
+    warm, interval = _watched[data_dir]
+    threading.Thread(target=_reload, args=(data_dir, warm, interval), name='dataset-reloader', daemon=True).start()
+
+
+def _after_fork():
+    # Threads do not survive fork: a forked worker keeps the parent's loaded
+    # Datasets (shared copy-on-write) but needs its own reloader threads.
+    global _datasets_lock
+    _datasets_lock = threading.Lock()
+    _company_datasets._after_fork()
+    for data_dir in _watched:
+        _start_reloader(data_dir)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
@@ -0,0 +1,67 @@
+from currency import DEFAULT_CURRENCY, financials_in, metric_columns
+from dataset import frame_records
+from serialization import dumps
+
+# Rows rendered per chunk written to the response
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _financials(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    frame = financials_in(dataset, currency, rates)
+    if frame is None:
+        return None
+    columns = ['year'] + [metric for metric in metric_columns(currency) if metric in frame.columns]
+    return columns, (chunk[columns] for chunk in _chunks(frame))
+
+
+def _right_issues(dataset, **options):
+    frame = dataset.right_issues
+    if frame is None:
+        return None
+    return list(frame.columns), _chunks(frame)
+
+
+def _shareholders(dataset, **options):
+    if not dataset.shareholders:
+        return None
+    # As /api/shareholders returns them; rank is empty for years stored without one
+    columns = ['fiscal_year', 'rank', 'shareholder_name', 'ownership_percentage']
+
+    def chunks():
+        for fiscal_year, df in dataset.shareholders.items():
+            for chunk in _chunks(df):
+                chunk = chunk.assign(fiscal_year=fiscal_year).reindex(columns=columns)
+                yield chunk.astype({'rank': 'Int64'})
+    return columns, chunks()
+
+
+# Export name -> function returning (columns, iterator of DataFrame chunks), or None if missing;
+# each is called with the Dataset, 'financials' also with the requested currency and rate table
+EXPORT_SOURCES = {
+    'financials': _financials,
+    'right-issues': _right_issues,
+    'shareholders': _shareholders,
+}
+
+
+def stream_export(columns, chunks, fmt):
+    """Yield the export body chunk by chunk; nothing beyond one chunk is held in memory."""
+    if fmt == 'csv':
+        yield ','.join(columns) + '\n'
+        for chunk in chunks:
+            yield chunk.to_csv(header=False, index=False)
+    else:
+        for chunk in chunks:
+            # Shortest round-trip floats, as in the JSON responses (to_json would write 11.619999999999999)
+            if not chunk.empty:
+                yield b'\n'.join(dumps(record) for record in frame_records(chunk)) + b'\n'
@@ -1,14 +1,13 @@
 import os
 import pandas as pd
-import camelot
-import tabula
 import re
 from datetime import datetime
 import logging
 from pathlib import Path
 import warnings
-from PyPDF2 import PdfReader
-import numpy as np
+import shutil
+from dataset import DEFAULT_COMPANY
+from publish import publish, publish_lock, staging_dir
 
 # Add scale factors and order for normalization
 SCALE_FACTORS = {'Bn': 1e9, 'Mn': 1e6, 'K': 1e3, '': 1}
@@ -17,15 +16,16 @@ SCALE_ORDER = ['Mn', 'Bn', 'K', '']  # Prefer Mn, then Bn, then K, then raw
 # Suppress PyPDF2 deprecation warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-# Configure logging with proper encoding handling
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('data_extraction.log', encoding='utf-8', errors='replace'),
-        logging.StreamHandler()
-    ]
-)
+def configure_logging():
+    """Log to the console and data_extraction.log; called when the extractor runs, not on import."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('data_extraction.log', encoding='utf-8', errors='replace'),
+            logging.StreamHandler()
+        ]
+    )
 
 # Mapping from filename to report year (use ending year for ranges)
 FILENAME_YEAR_MAP = {
@@ -95,6 +95,8 @@ def format_number(value, target_scale='millions'):
 
 def extract_year_from_pdf_content(pdf_path):
     """Extract year from PDF content using multiple methods."""
+    from PyPDF2 import PdfReader
+
     try:
         reader = PdfReader(pdf_path)
         text = ""
@@ -226,6 +228,9 @@ def clean_numeric_value(value):
 
 def extract_tables_from_pdf(pdf_path):
     """Extract tables from PDF using both Camelot and Tabula with improved settings."""
+    # PDF libraries are imported on first use so importing this module stays cheap
+    import camelot
+
     tables = []
     
     # Try Camelot with different settings
@@ -255,6 +260,7 @@ def extract_tables_from_pdf(pdf_path):
 
     # Try Tabula if Camelot didn't find enough tables
     if len(tables) < 5:
+        import tabula
         try:
             tabula_tables = tabula.read_pdf(
                 pdf_path,
@@ -305,31 +311,19 @@ def find_value_in_row(row, keywords, nearby_cols=3):
     return None
 
 def find_financial_metrics(tables, year):
-    """Extract key financial metrics from tables with enhanced patterns."""
-    # Historical exchange rates (LKR to USD)
-    exchange_rates = {
-        2019: 178.78,  # Average rate for 2019
-        2020: 185.52,  # Average rate for 2020
-        2021: 198.88,  # Average rate for 2021
-        2022: 359.89,  # Average rate for 2022
-        2023: 322.77   # Average rate for 2023
-    }
-    
+    """
+    Extract key financial metrics from tables with enhanced patterns. Monetary
+    values are kept in LKR; other currencies are computed by the API (currency.py).
+    """
     metrics = {
         'year': year,
         'total_revenue_lkr': None,
-        'total_revenue_usd': None,
         'cost_of_sales_lkr': None,
-        'cost_of_sales_usd': None,
         'operating_expenses_lkr': None,
-        'operating_expenses_usd': None,
         'net_profit_lkr': None,
-        'net_profit_usd': None,
         'share_count': None,
         'eps_lkr': None,
-        'eps_usd': None,
         'net_asset_per_share_lkr': None,
-        'net_asset_per_share_usd': None,
         'gross_profit_margin': None,
         'events': None,
         'scale': None
@@ -440,19 +434,8 @@ def find_financial_metrics(tables, year):
                         metrics[metric] = value * scale_multiplier
                         logging.info(f"Found {metric}: {value} (scale: {scale_multiplier})")
     
-    # Convert values and calculate derived metrics
+    # Calculate derived metrics
     if metrics['total_revenue_lkr'] is not None:
-        # Convert to USD
-        exchange_rate = exchange_rates.get(year)
-        if exchange_rate:
-            metrics['total_revenue_usd'] = metrics['total_revenue_lkr'] / exchange_rate
-            
-            # Convert other LKR values to USD
-            for metric in metrics:
-                if metric.endswith('_lkr') and metrics[metric] is not None:
-                    usd_metric = metric.replace('_lkr', '_usd')
-                    metrics[usd_metric] = metrics[metric] / exchange_rate
-        
         # Calculate gross profit margin if possible
         if metrics['cost_of_sales_lkr'] is not None:
             gross_profit = metrics['total_revenue_lkr'] - metrics['cost_of_sales_lkr']
@@ -687,7 +670,7 @@ def find_financial_metrics_all_years(tables, main_year=None):
                 if v is not None and v >= 0:  # Only positive values
                     # Try to infer scale from column name or value
                     scale = 'Mn'  # Default to Mn
-                    if k.endswith('_usd') or k.endswith('_lkr'):
+                    if k.endswith('_lkr'):
                         # If value is < 1, probably Bn; if > 1000, probably K
                         if v < 1:
                             scale = 'Bn'
@@ -739,6 +722,8 @@ def find_right_issues_all_years(tables):
     return issues
 
 def extract_shareholders_from_pdf(pdf_path, fiscal_years, output_dir):
+    from PyPDF2 import PdfReader
+
     reader = PdfReader(str(pdf_path))
     text = ""
     for page in reader.pages:
@@ -804,8 +789,9 @@ def extract_all_shareholders_tables(pdf_folder, output_dir):
 def extract_pdf_tables(pdf_folder=r'C:\GITHUB\AI-Dashboard\backend\data'):
     """Process all PDFs and extract all data types, with fallback to combining in financial_metrics.csv."""
     pdf_folder = Path(pdf_folder)
-    output_dir = pdf_folder.parent / 'data_cleaned'
-    output_dir.mkdir(exist_ok=True)
+    data_dir = pdf_folder.parent / 'data_cleaned'
+    # Everything is written to a staging directory and published in one step at the end
+    output_dir = staging_dir(data_dir)
     
     all_metrics = {}
     all_shareholders = []
@@ -898,9 +884,15 @@ def extract_pdf_tables(pdf_folder=r'C:\GITHUB\AI-Dashboard\backend\data'):
             
         # Call the new shareholders extraction
         extract_all_shareholders_tables(pdf_folder, output_dir)
+
+        # Move the new files into data_cleaned, refresh the store and snapshot, bump the version
+        with publish_lock(data_dir):
+            publish(output_dir, data_dir, DEFAULT_COMPANY)
             
     except Exception as e:
         logging.error(f"Error saving data: {str(e)}")
+        shutil.rmtree(output_dir, ignore_errors=True)
 
 if __name__ == "__main__":
+    configure_logging()
     extract_pdf_tables()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import numpy as np
+
+from currency import DEFAULT_CURRENCY, financials_in, metric_columns
+from dataset import DEFAULT_COMPANY, FINANCIAL_METRICS
+
+
+class FinancialStore:
+    """
+    Normalized financial metrics held column by column, keyed by company and
+    year. A query is two binary searches on the sorted years plus one slice per
+    requested metric; rows are only assembled for the columns actually asked for.
+    """
+
+    def __init__(self):
+        self._years = {}      # company -> sorted int64 year array
+        self._columns = {}    # company -> {metric: float64 array aligned with the years}
+
+    def add(self, company, frame, metrics=FINANCIAL_METRICS):
+        """Store the `metrics` columns of `frame` (which also has a 'year' column) as `company`'s data."""
+        if not frame['year'].is_monotonic_increasing:
+            frame = frame.sort_values('year', kind='mergesort')
+        self._years[company] = frame['year'].to_numpy(dtype=np.int64)
+        self._columns[company] = {
+            metric: frame[metric].to_numpy(dtype=float)
+            for metric in metrics if metric in frame.columns
+        }
+
+    @property
+    def companies(self):
+        return list(self._years)
+
+    def metrics(self, company=DEFAULT_COMPANY):
+        return list(self._columns[company])
+
+    def query(self, company=DEFAULT_COMPANY, start=None, end=None, metrics=None):
+        """
+        {'year': [...], metric: [...]} for `company`'s years in the inclusive range
+        [start, end], restricted to `metrics` (every metric when None). NaN is None.
+        Raises KeyError for an unknown company or metric.
+        """
+        years = self._years[company]
+        columns = self._columns[company]
+        metrics = list(columns) if metrics is None else metrics
+        unknown = [metric for metric in metrics if metric not in columns]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        lo = 0 if start is None else np.searchsorted(years, start, side='left')
+        hi = len(years) if end is None else np.searchsorted(years, end, side='right')
+        result = {'year': years[lo:hi].tolist()}
+        for metric in metrics:
+            values = columns[metric][lo:hi]
+            result[metric] = [None if np.isnan(v) else v for v in values.tolist()]
+        return result
+
+
+def columns_to_records(columns):
+    """Rows for a {field: [values]} mapping whose lists are aligned."""
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*columns.values())]
+
+
+def build_financial_store(dataset, currency=DEFAULT_CURRENCY, rates=None):
+    """A FinancialStore of the Dataset's metrics, the LKR ones also in `currency`."""
+    store = FinancialStore()
+    if dataset.financials is not None:
+        store.add(dataset.company, financials_in(dataset, currency, rates), metric_columns(currency))
+    return store
@@ -0,0 +1,318 @@
+"""
+Forecast jobs: Prophet fits queued from the API and polled by job id.
+
+Fits run in a bounded pool of worker processes owned by the web process that
+accepted the job, so request threads never block on Stan. Job state and
+results live in a SQLite file shared by every web process, so a job can be
+polled from whichever gunicorn worker answers. A job still queued or running
+when the process that owns its pool has exited is reported as failed.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import forecasting
+from dataset import DATA_DIR
+from forecasting import forecast_response
+from metrics import FORECAST_FIT, FORECASTS_IN_FLIGHT, cache_lookup
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILE = 'forecast_jobs.sqlite'
+MAX_WORKERS = int(os.environ.get('FORECAST_WORKERS', 2))
+# Unfinished jobs allowed over all web processes together
+MAX_PENDING_JOBS = int(os.environ.get('FORECAST_MAX_PENDING', 32))
+JOB_TTL_SECONDS = int(os.environ.get('FORECAST_JOB_TTL', 600))
+MAX_WAIT_SECONDS = 30
+POLL_INTERVAL = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    job_key TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    periods INTEGER NOT NULL,
+    engine TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_job_key ON jobs (job_key, created_at);
+"""
+
+UNFINISHED = ('queued', 'running')
+_UNFINISHED_SQL = "status IN ('queued', 'running')"
+
+_queue_path = DATA_DIR / QUEUE_FILE
+_executor = None
+_lock = threading.Lock()
+
+
+class QueueFullError(Exception):
+    """Raised when MAX_PENDING_JOBS jobs are already unfinished."""
+
+
+def configure(max_workers=None, max_pending=None, queue_path=None):
+    """Override the pool size, queue bound and job file; the pool size takes effect when the pool is next created."""
+    global MAX_WORKERS, MAX_PENDING_JOBS, _queue_path
+    if max_workers is not None:
+        MAX_WORKERS = int(max_workers)
+    if max_pending is not None:
+        MAX_PENDING_JOBS = int(max_pending)
+    if queue_path is not None:
+        _queue_path = queue_path
+
+
+def connect(path):
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _owner_alive(owner):
+    """Whether the process named by `owner` (host:pid) may still be running; other hosts are assumed alive."""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def _update(queue_path, job_id, statuses, **fields):
+    """Set `fields` on the job if its status is one of `statuses`; returns whether it was."""
+    fields['updated_at'] = time.time()
+    conn = connect(queue_path)
+    try:
+        cursor = conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} "
+            f"WHERE id = ? AND status IN ({', '.join('?' for _ in statuses)})",
+            (*fields.values(), job_id, *statuses)
+        )
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # 'spawn' keeps the children clear of the Flask threads' locks
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def _init_worker():
+    # The parent records pool fits in _fit_done; recording them here too would count them twice
+    forecasting.RECORD_FITS = False
+
+
+def _fit(queue_path, job_id, frame, metric, periods, engine):
+    """Runs in a pool process: fit, store the result on the job and return the seconds the fit took."""
+    _update(queue_path, job_id, ('queued',), status='running')
+    started = time.perf_counter()
+    result = forecast_response(frame, metric, periods, engine)
+    seconds = time.perf_counter() - started
+    now = time.time()
+    _update(queue_path, job_id, UNFINISHED, status='done', result=dumps(result).decode(), finished_at=now)
+    return seconds
+
+
+def _fit_done(queue_path, job_id, engine, future):
+    FORECASTS_IN_FLIGHT.labels(engine).dec()
+    if future.cancelled():
+        error = 'Forecast was cancelled when the worker pool restarted; submit it again'
+    elif future.exception() is not None:
+        logger.error(f"Forecast job {job_id} failed: {future.exception()}")
+        error = 'Forecast failed'
+    else:
+        FORECAST_FIT.labels(engine).observe(future.result())
+        return
+    try:
+        _update(queue_path, job_id, UNFINISHED, status='failed', error=error, finished_at=time.time())
+    except sqlite3.Error as e:
+        logger.error(f"Could not record the failure of forecast job {job_id}: {e}")
+
+
+def _submit_fit(queue_path, job_id, frame, metric, periods, engine):
+    """Queue one fit, restarting the pool once if a worker died."""
+    with _lock:
+        try:
+            future = _get_executor().submit(_fit, str(queue_path), job_id, frame, metric, periods, engine)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM in a Stan fit); start a fresh pool
+            logger.warning("Forecast worker pool broken, restarting it")
+            _reset_executor()
+            future = _get_executor().submit(_fit, str(queue_path), job_id, frame, metric, periods, engine)
+    FORECASTS_IN_FLIGHT.labels(engine).inc()
+    future.add_done_callback(partial(_fit_done, queue_path, job_id, engine))
+    return future
+
+
+def _reset_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def shutdown(wait=True):
+    """Stop this process's fit pool, by default after its queued fits have finished."""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _fail_orphans(conn, now):
+    """Fail unfinished jobs whose owning process has exited. Caller is in a transaction."""
+    owners = [row['owner'] for row in conn.execute(
+        f"SELECT DISTINCT owner FROM jobs WHERE {_UNFINISHED_SQL}"
+    )]
+    for owner in owners:
+        if not _owner_alive(owner):
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? "
+                f"WHERE owner = ? AND {_UNFINISHED_SQL}",
+                ('Forecast worker stopped; submit it again', now, now, owner)
+            )
+
+
+def _prune(conn, now):
+    """Drop finished jobs older than the TTL. Caller is in a transaction."""
+    conn.execute(
+        f"DELETE FROM jobs WHERE NOT {_UNFINISHED_SQL} AND created_at < ?", (now - JOB_TTL_SECONDS,)
+    )
+
+
+def submit(frame, metric, periods, engine, data_version=None):
+    """
+    Queue a forecast fit and return its job id. Identical requests against the
+    same data version share one job instead of fitting twice.
+    """
+    return submit_batch(frame, [metric], periods, engine, data_version)[metric]
+
+
+def submit_batch(frame, metrics, periods, engine, data_version=None):
+    """
+    Queue one fit per metric of `frame` and return {metric: job id}, reusing
+    unfailed jobs of any web process as submit does. All are queued or, when
+    they would take the unfinished jobs past MAX_PENDING_JOBS, none are and
+    QueueFullError is raised.
+    """
+    queue_path = _queue_path
+    now = time.time()
+    owner = _owner()
+    conn = connect(queue_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        _fail_orphans(conn, now)
+        _prune(conn, now)
+        job_ids = {}
+        for metric in metrics:
+            key = json.dumps([metric, periods, engine, data_version])
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE job_key = ? AND status != 'failed' ORDER BY created_at DESC LIMIT 1",
+                (key,)
+            ).fetchone()
+            job_ids[metric] = (row['id'], None) if row is not None else (uuid.uuid4().hex, key)
+        missing = [metric for metric, (_, key) in job_ids.items() if key is not None]
+        pending = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {_UNFINISHED_SQL}").fetchone()[0]
+        if missing and pending + len(missing) > MAX_PENDING_JOBS:
+            conn.execute('ROLLBACK')
+            raise QueueFullError('Too many forecast jobs in progress')
+        for metric in missing:
+            job_id, key = job_ids[metric]
+            conn.execute(
+                'INSERT INTO jobs (id, job_key, metric, periods, engine, status, owner, created_at, updated_at) '
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, key, metric, periods, engine, owner, now, now)
+            )
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+    for metric in metrics:
+        cache_lookup('forecast', metric not in missing)
+    for metric in missing:
+        job_id = job_ids[metric][0]
+        try:
+            _submit_fit(queue_path, job_id, frame[['year', metric]].dropna(), metric, periods, engine)
+        except Exception as e:
+            logger.error(f"Could not queue forecast job {job_id}: {e}")
+            _update(queue_path, job_id, UNFINISHED, status='failed', error='Forecast could not be queued',
+                    finished_at=time.time())
+            continue
+        logger.info(f"Queued forecast job {job_id} ({metric}, {engine}, {periods} periods)")
+    return {metric: job_id for metric, (job_id, _) in job_ids.items()}
+
+
+def _read(queue_path, job_id):
+    conn = connect(queue_path)
+    try:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is not None and row['status'] in UNFINISHED and not _owner_alive(row['owner']):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? "
+                f"WHERE id = ? AND {_UNFINISHED_SQL}",
+                ('Forecast worker stopped; submit it again', now, now, job_id)
+            )
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row
+    finally:
+        conn.close()
+
+
+def status(job_id, wait=0):
+    """
+    Return the job's state as a dict, or None for an unknown job. With `wait`
+    the call long-polls up to that many seconds for the job to finish.
+    """
+    queue_path = _queue_path
+    deadline = time.monotonic() + min(max(wait, 0), MAX_WAIT_SECONDS)
+    row = _read(queue_path, job_id)
+    while row is not None and row['status'] in UNFINISHED and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        row = _read(queue_path, job_id)
+    if row is None:
+        return None
+
+    state = {
+        'job_id': job_id, 'metric': row['metric'], 'periods': row['periods'], 'engine': row['engine'],
+        'status': row['status'],
+    }
+    if row['status'] == 'failed':
+        state['error'] = row['error']
+    elif row['status'] == 'done':
+        state['result'] = json.loads(row['result'])
+    return state
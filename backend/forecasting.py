@@ -0,0 +1,225 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+
+# Closed-form engines work on a (n_series, n_years) matrix so every metric is
+# forecast in one pass. Prophet stays available as an opt-in engine.
+FAST_ENGINES = ('linear', 'holt', 'loglinear')
+ENGINES = FAST_ENGINES + ('prophet',)
+DEFAULT_ENGINE = 'linear'
+# Forecast horizons the API accepts, in years; requests outside are clamped
+MIN_PERIODS = 1
+MAX_PERIODS = 20
+
+# Holt's damped trend smoothing parameters
+HOLT_ALPHA = 0.8
+HOLT_BETA = 0.2
+HOLT_PHI = 0.9
+
+# Whether forecast_metrics records its Prophet fits in the metrics module. The
+# forecast pool turns it off in its processes: the parent records those fits.
+RECORD_FITS = True
+
+
+def _z_value(level):
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def _fill_gaps(values):
+    """Forward-fill NaNs along each row, back-filling any leading gap."""
+    values = np.array(values, dtype=float)
+    n_cols = values.shape[1]
+    idx = np.where(np.isnan(values), 0, np.arange(n_cols))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = values[np.arange(values.shape[0])[:, None], idx]
+    first_valid = np.argmax(~np.isnan(values), axis=1)
+    first = values[np.arange(values.shape[0]), first_valid]
+    return np.where(np.isnan(filled), first[:, None], filled)
+
+
+def _linear_fit(x, y, periods, level):
+    """Least-squares trend for every row of y, ignoring NaNs."""
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=1)
+    yz = np.where(mask, y, 0.0)
+    xm = np.where(mask, x, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = xm.sum(axis=1) / n
+        y_mean = yz.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * (yz - y_mean[:, None])).sum(axis=1) / sxx, 0.0)
+        intercept = y_mean - slope * x_mean
+        resid = np.where(mask, y - (intercept[:, None] + slope[:, None] * x), 0.0)
+        dof = np.maximum(n - 2, 1)
+        sigma = np.sqrt((resid ** 2).sum(axis=1) / dof)
+
+        x_future = x[-1] + np.arange(1, periods + 1)
+        yhat = intercept[:, None] + slope[:, None] * x_future
+        spread = np.sqrt(
+            1 + 1 / n[:, None]
+            + (x_future - x_mean[:, None]) ** 2 / np.where(sxx > 0, sxx, np.inf)[:, None]
+        )
+    half_width = _z_value(level) * sigma[:, None] * spread
+    return yhat, yhat - half_width, yhat + half_width
+
+
+def _holt_fit(y, periods, level, alpha=HOLT_ALPHA, beta=HOLT_BETA, phi=HOLT_PHI):
+    """Holt's damped additive trend, recursing over years for all rows at once."""
+    y = _fill_gaps(y)
+    lvl = y[:, 0].copy()
+    trend = y[:, 1] - y[:, 0] if y.shape[1] > 1 else np.zeros(y.shape[0])
+    sq_err = np.zeros(y.shape[0])
+    for t in range(1, y.shape[1]):
+        pred = lvl + phi * trend
+        err = y[:, t] - pred
+        sq_err += err ** 2
+        new_lvl = pred + alpha * err
+        trend = phi * trend + alpha * beta * err
+        lvl = new_lvl
+    sigma = np.sqrt(sq_err / max(y.shape[1] - 1, 1))
+
+    steps = np.arange(1, periods + 1)
+    damp = np.cumsum(phi ** steps)
+    yhat = lvl[:, None] + damp[None, :] * trend[:, None]
+    # Variance multiplier for the damped-trend state space model
+    c = alpha * (1 + beta * np.concatenate(([0.0], damp[:-1])))
+    var_mult = 1 + np.concatenate(([0.0], np.cumsum(c[1:] ** 2)))
+    half_width = _z_value(level) * sigma[:, None] * np.sqrt(var_mult)[None, :]
+    return yhat, yhat - half_width, yhat + half_width
+
+
+def _loglinear_fit(x, y, periods, level):
+    """Constant growth rate fit: linear trend on log values, non-positive values ignored."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_y = np.where(y > 0, np.log(np.where(y > 0, y, 1.0)), np.nan)
+    yhat, lower, upper = _linear_fit(x, log_y, periods, level)
+    return np.exp(yhat), np.exp(lower), np.exp(upper)
+
+
+def forecast_matrix(years, values, periods=3, engine=DEFAULT_ENGINE, level=0.95, **params):
+    """
+    Forecast every row of `values` (n_series x n_years) with a closed-form engine.
+    `params` are engine settings (alpha, beta and phi for 'holt').
+    Returns (future_years, yhat, lower, upper); the last three are (n_series x periods).
+    """
+    if engine not in FAST_ENGINES:
+        raise ValueError(f"Unknown forecast engine: {engine}")
+    x = np.asarray(years, dtype=float)
+    y = np.atleast_2d(np.asarray(values, dtype=float))
+    future_years = [int(years[-1]) + i for i in range(1, periods + 1)]
+    if engine == 'linear':
+        yhat, lower, upper = _linear_fit(x, y, periods, level)
+    elif engine == 'holt':
+        yhat, lower, upper = _holt_fit(y, periods, level, **params)
+    else:
+        yhat, lower, upper = _loglinear_fit(x, y, periods, level)
+    return future_years, yhat, lower, upper
+
+
+def prophet_forecast(years, values, periods=3, level=0.95, **params):
+    """
+    Fit a Prophet model to one annual series; `params` go to the Prophet constructor.
+    Returns (future_years, yhat, lower, upper).
+    """
+    # Imported on first use: prophet pulls in Stan and plotting libraries the fast engines never need
+    from prophet import Prophet
+
+    df_prophet = pd.DataFrame({'ds': pd.to_datetime([str(y) for y in years], format='%Y'), 'y': values})
+    model = Prophet(
+        **{
+            'yearly_seasonality': True, 'daily_seasonality': False, 'weekly_seasonality': False,
+            'interval_width': level, **params,
+        }
+    )
+    model.fit(df_prophet)
+    future = model.make_future_dataframe(periods=periods, freq='Y')
+    forecast = model.predict(future).tail(periods)
+    future_years = [int(years[-1]) + i for i in range(1, periods + 1)]
+    return (
+        future_years,
+        forecast['yhat'].to_numpy()[None, :],
+        forecast['yhat_lower'].to_numpy()[None, :],
+        forecast['yhat_upper'].to_numpy()[None, :],
+    )
+
+
+@contextmanager
+def _unrecorded(engine):
+    yield
+
+
+def forecast_metrics(frame, metrics, periods=3, engine=DEFAULT_ENGINE, level=0.95):
+    """
+    Forecast several metric columns of a normalized financials frame.
+    Fast engines handle all metrics in a single matrix computation.
+    Returns {metric: [{'year', 'forecast', 'lower', 'upper'}, ...]}.
+    """
+    frame = frame.sort_values('year')
+    years = frame['year'].astype(int).tolist()
+    results = {}
+    if engine == 'prophet':
+        if RECORD_FITS:
+            # Imported here: metrics pulls in prometheus_client, which the fast engines never need
+            from metrics import forecast_fit
+        else:
+            forecast_fit = _unrecorded
+        for metric in metrics:
+            series = frame[['year', metric]].dropna()
+            if series.empty:
+                results[metric] = []
+                continue
+            with forecast_fit(engine):
+                future_years, yhat, lower, upper = prophet_forecast(
+                    series['year'].astype(int).tolist(), series[metric].to_numpy(dtype=float), periods, level
+                )
+            results[metric] = _rows(future_years, yhat[0], lower[0], upper[0])
+        return results
+
+    values = frame[list(metrics)].to_numpy(dtype=float).T
+    future_years, yhat, lower, upper = forecast_matrix(years, values, periods, engine, level)
+    for i, metric in enumerate(metrics):
+        if np.isnan(values[i]).all():
+            results[metric] = []
+        else:
+            results[metric] = _rows(future_years, yhat[i], lower[i], upper[i])
+    return results
+
+
+def _clip(value):
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return max(0, value)
+
+
+def _rows(future_years, yhat, lower, upper):
+    return [
+        {
+            'year': year,
+            'forecast': _clip(yhat[i]),
+            'lower': _clip(lower[i]),
+            'upper': _clip(upper[i]),
+        }
+        for i, year in enumerate(future_years)
+    ]
+
+
+def forecast_response(frame, metric, periods=3, engine=DEFAULT_ENGINE):
+    """Build the /api/forecast payload: historical years with no forecast, then forecast rows."""
+    result = [{'year': int(year), 'forecast': None} for year in frame['year']]
+    result.extend(forecast_metrics(frame, [metric], periods=periods, engine=engine)[metric])
+    return result
+
+
+def forecast_batch_response(frame, metrics, periods=3, engine=DEFAULT_ENGINE):
+    """Build {metric: /api/forecast payload} for several metrics from one forecast_metrics call."""
+    forecasts = forecast_metrics(frame, metrics, periods=periods, engine=engine)
+    result = {}
+    for metric in metrics:
+        years = frame.loc[frame[metric].notna(), 'year']
+        result[metric] = [{'year': int(year), 'forecast': None} for year in years]
+        result[metric].extend(forecasts[metric])
+    return result
@@ -0,0 +1,28 @@
+"""
+gunicorn settings for wsgi:app. Worker counts and the bind address come from
+the environment; app settings (DATA_DIR, WARM_FORECASTS, FORECAST_WORKERS, ...)
+are read by app.config_from_env. State that must be seen by every worker, such
+as forecast jobs, lives in SQLite files rather than in worker memory.
+"""
+import multiprocessing
+import os
+
+# Every web worker would start REPORT_WORKERS extraction processes of its own,
+# so the web tier starts none and the pool runs once, separately:
+#     python report_jobs.py --workers 2
+os.environ.setdefault('REPORT_WORKERS', '0')
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads let one worker hold forecast long-polls (up to 30s) while serving other requests
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+timeout = 60
+# Load and warm the data in the master, before forking
+preload_app = True
+
+
+def child_exit(server, worker):
+    # With PROMETHEUS_MULTIPROC_DIR set, drop the exited worker's live gauges
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
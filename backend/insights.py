@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Event annotations appended to insights for the year they affected
+EVENT_MAP = {
+    2019: "Easter Sunday Attacks Impact",
+    2020: "COVID-19 Impact",
+    2022: "Tax Changes"
+}
+
+CHANGE_TEMPLATE = "{label} {direction} {abs_pct:.1f}% from {prev} in {prev_year} to {curr} in {year}."
+SIGNIFICANT_TEMPLATE = (
+    "{label} {direction} significantly ({prev:.2f}% to {curr:.2f}%) "
+    "from {prev_year} to {year} ({pct:+.1f}%)."
+)
+
+# Value formats: absolute amounts are shown with thousands separators, per-share figures with 2 decimals
+VALUE_FORMATS = {
+    'Mn': lambda v: f"{int(v):,} Mn",
+    'per_share': lambda v: f"{v:.2f}",
+    'percent': lambda v: v,
+}
+
+# One entry per insight series. `scaled` metrics are read from the normalized
+# (absolute-valued) frame, the rest as stored. A `threshold` only reports years
+# whose absolute change exceeds it.
+INSIGHT_SPECS = [
+    {'key': 'revenue', 'column': 'total_revenue_lkr', 'label': 'Total revenue',
+     'up': 'increased', 'down': 'declined', 'unit': 'Mn'},
+    {'key': 'gross_profit_margin', 'column': 'gross_profit_margin', 'label': 'Gross profit margin',
+     'up': 'increased', 'down': 'decreased', 'unit': 'percent', 'scaled': False,
+     'threshold': 5, 'template': SIGNIFICANT_TEMPLATE},
+    {'key': 'eps', 'column': 'eps_lkr', 'label': 'EPS',
+     'up': 'rose', 'down': 'dropped', 'unit': 'per_share'},
+    {'key': 'operating_expenses', 'column': 'operating_expenses_lkr', 'label': 'Operating expenses',
+     'up': 'increased', 'down': 'decreased', 'unit': 'Mn'},
+    {'key': 'cost_of_sales', 'column': 'cost_of_sales_lkr', 'label': 'Cost of sales',
+     'up': 'increased', 'down': 'decreased', 'unit': 'Mn'},
+    {'key': 'net_profit', 'column': 'net_profit_lkr', 'label': 'Net profit',
+     'up': 'rose', 'down': 'dropped', 'unit': 'Mn'},
+    {'key': 'net_asset_per_share', 'column': 'net_asset_per_share_lkr', 'label': 'Net asset per share',
+     'up': 'increased', 'down': 'declined', 'unit': 'per_share'},
+]
+
+RIGHT_ISSUES_TEMPLATE = "Right issues in {year}: {count} issues, average price LKR {avg:.2f}."
+
+
+def _metric_frame(raw, normalized):
+    """Per-spec value columns, scaled or raw as the spec asks, aligned by year."""
+    raw = raw.sort_values('year').reset_index(drop=True)
+    columns = {}
+    for spec in INSIGHT_SPECS:
+        source = normalized if spec.get('scaled', True) else raw
+        if spec['column'] in source.columns:
+            columns[spec['key']] = pd.to_numeric(source[spec['column']], errors='coerce').to_numpy()
+    return pd.DataFrame(columns, index=normalized['year'].to_numpy())
+
+
+def build_financial_insights(raw, normalized):
+    """Render YoY insight sentences for every spec from one vectorized change computation."""
+    values = _metric_frame(raw, normalized)
+    prev = values.shift(1)
+    # Same as pct_change without its implicit forward-fill across missing years
+    pct = (values - prev) / prev * 100
+    years = values.index.to_numpy()
+    prev_years = np.concatenate(([None], years[:-1]))
+
+    insights = {spec['key']: [] for spec in INSIGHT_SPECS}
+    for spec in INSIGHT_SPECS:
+        key = spec['key']
+        if key not in values.columns:
+            continue
+        curr_col, prev_col, pct_col = values[key], prev[key], pct[key]
+        # Only pairs of known values with a non-zero base produce a percentage
+        valid = curr_col.notna() & prev_col.notna() & (prev_col != 0)
+        if 'threshold' in spec:
+            valid &= (curr_col - prev_col).abs() > spec['threshold']
+        fmt = VALUE_FORMATS[spec['unit']]
+        template = spec.get('template', CHANGE_TEMPLATE)
+        for i in np.flatnonzero(valid.to_numpy()):
+            curr_value, prev_value, change = curr_col.iat[i], prev_col.iat[i], pct_col.iat[i]
+            down = curr_value < prev_value
+            msg = template.format(
+                label=spec['label'],
+                direction=spec['down'] if down else spec['up'],
+                pct=change,
+                abs_pct=abs(change),
+                prev=fmt(prev_value),
+                curr=fmt(curr_value),
+                prev_year=prev_years[i],
+                year=years[i],
+            )
+            event = EVENT_MAP.get(years[i])
+            if event:
+                msg += f" ({event})"
+            insights[key].append(msg)
+    return insights
+
+
+def build_right_issue_insights(right_issues):
+    """One summary sentence per year with priced right issues."""
+    if right_issues is None:
+        return []
+    priced = right_issues.dropna(subset=['issue_price'])
+    summary = priced.groupby('year')['issue_price'].agg(['count', 'mean'])
+    return [
+        RIGHT_ISSUES_TEMPLATE.format(year=year, count=int(row['count']), avg=row['mean'])
+        for year, row in summary.iterrows()
+    ]
+
+
+def build_insights(dataset):
+    """The full /api/insights bundle for one Dataset; cached per data version by the caller."""
+    insights = build_financial_insights(dataset.financials_raw, dataset.financials)
+    insights['right_issues'] = build_right_issue_insights(dataset.right_issues)
+    return insights
@@ -0,0 +1,346 @@
+"""
+Offline load test of every API endpoint against synthetic data.
+
+Builds a scaled-up synthetic copy of data_cleaned (many years, a large right
+issues table, long shareholder lists, many companies in the store), serves it
+through the Flask test client or a local threaded server on 127.0.0.1, and
+drives a weighted request mix from concurrent threads. For every endpoint it
+reports throughput and p50/p95/p99 latency, both cold (first request after the
+caches are dropped) and warm.
+
+    python loadtest.py --mix read --concurrency 8 --requests 2000
+    python loadtest.py --mix all --save-baseline loadtest_baseline.json
+    python loadtest.py --mix all --baseline loadtest_baseline.json   # exit 1 on regression
+"""
+import argparse
+import http.client
+import json
+import logging
+import random
+import shutil
+import string
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dataset as dataset_module
+import storage
+from dataset import FINANCIAL_METRICS, SHAREHOLDERS_PREFIX
+from shareholders import canonical_name
+
+logger = logging.getLogger(__name__)
+
+# Endpoint name -> (method, path); {year}, {fiscal_year}, {holder_id}, {name} and {company} come from the synthetic data
+ENDPOINTS = {
+    'index': ('GET', '/'),
+    'financials': ('GET', '/api/financials'),
+    'financials_query': ('GET', '/api/financials?years={year}-&metrics=eps_lkr,total_revenue_lkr'),
+    'financials_lkr': ('GET', '/api/financials?currency=LKR'),
+    'currencies': ('GET', '/api/currencies'),
+    'ratios': ('GET', '/api/ratios'),
+    'ratios_query': ('GET', '/api/ratios?years={year}-&metrics=net_margin,total_revenue_yoy,total_revenue_cagr_3y'),
+    'shareholders_all': ('GET', '/api/shareholders'),
+    'shareholders_year': ('GET', '/api/shareholders?year={fiscal_year}'),
+    'shareholders_matrix': ('GET', '/api/shareholders/matrix'),
+    'shareholders_resolve': ('GET', '/api/shareholders/resolve?name={name}'),
+    'shareholder_history': ('GET', '/api/shareholders/{holder_id}/history'),
+    'right_issues': ('GET', '/api/right-issues'),
+    'right_issues_page': ('GET', '/api/right-issues?year_from={year}&min_price=10&fields=year,issue_price&limit=100'),
+    'export_csv': ('GET', '/api/export/right-issues?format=csv'),
+    'export_ndjson': ('GET', '/api/export/financials?format=ndjson'),
+    'dashboard': ('GET', '/api/dashboard'),
+    'dashboard_forecast': ('GET', '/api/dashboard?years={year}-&forecast=1'),
+    'insights': ('GET', '/api/insights'),
+    'forecast': ('GET', '/api/forecast?metric=eps_lkr&engine=holt'),
+    'forecast_batch': ('GET', '/api/forecast/batch'),
+    'forecast_prophet': ('POST', '/api/forecast/jobs?metric=net_profit_lkr&engine=prophet'),
+    'metrics': ('GET', '/metrics'),
+    'company_dashboard': ('GET', '/api/dashboard?company={company}'),
+}
+
+# Source -> endpoints it cannot serve, left out of every mix: with CSVs there
+# is only the default company, so ?company= names one that does not exist
+UNSUPPORTED_ENDPOINTS = {
+    'csv': ('company_dashboard',),
+}
+
+# Mix name -> {endpoint: weight}
+MIXES = {
+    'read': {
+        'financials': 30, 'financials_query': 20, 'dashboard': 15, 'insights': 10,
+        'shareholders_year': 8, 'shareholders_matrix': 4, 'right_issues_page': 8, 'shareholder_history': 5,
+    },
+    'forecast': {
+        'forecast': 40, 'forecast_batch': 30, 'dashboard_forecast': 25, 'forecast_prophet': 5,
+    },
+    'all': {name: 1 for name in ENDPOINTS},
+}
+
+# A p95 only counts as a regression when it is this much slower than the baseline, relatively and absolutely
+REGRESSION_TOLERANCE = 0.25
+REGRESSION_FLOOR_MS = 2.0
+
+
+def make_synthetic_data(out_dir, years=60, right_issues=200000, holders=500, companies=50, seed=0):
+    """
+    Write a synthetic data_cleaned to `out_dir`: `years` years of metrics (as
+    value and scale columns), `right_issues` right issues, `holders` holders
+    per fiscal year, plus `companies` extra companies in the SQLite store.
+    Returns the values used to fill endpoint templates.
+    """
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    year_values = np.arange(2024 - years, 2024)
+
+    financials = {'year': year_values}
+    for metric in FINANCIAL_METRICS:
+        financials[metric] = np.round(rng.lognormal(10, 1, years) * np.linspace(1, 3, years), 4)
+        financials[f'{metric}_scale'] = rng.choice(['K', 'Mn'], years)
+    pd.DataFrame(financials).to_csv(out_dir / 'financial_metrics.csv', index=False)
+
+    pd.DataFrame({
+        'year': np.sort(rng.choice(year_values, right_issues)),
+        'ratio': np.where(rng.random(right_issues) < 0.5, '1:10', None),
+        'issue_price': np.round(rng.lognormal(4, 1, right_issues), 2),
+    }).to_csv(out_dir / 'right_issues.csv', index=False)
+
+    names = [
+        f"{''.join(rng.choice(list(string.ascii_uppercase), 6))} Holdings {i} Limited" for i in range(holders * 2)
+    ]
+    fiscal_years = [f'{y}_{str(y + 1)[-2:]}' for y in year_values[-10:]]
+    for fiscal_year in fiscal_years:
+        chosen = rng.choice(len(names), holders, replace=False)
+        pct = np.sort(rng.random(holders))[::-1] * 10
+        pd.DataFrame({
+            'shareholder_name': [names[i] for i in chosen],
+            'ownership_percentage': np.round(pct, 2),
+        }).to_csv(out_dir / f'{SHAREHOLDERS_PREFIX}{fiscal_year}.csv', index=False)
+
+    # Other companies only live in the store; the API must not slow down because of them
+    if companies:
+        frame = dataset_module.normalize_financials(pd.read_csv(out_dir / 'financial_metrics.csv'))
+        for i in range(companies):
+            scaled = frame.assign(**{m: frame[m] * (1 + i / 100) for m in frame.columns if m != 'year'})
+            storage.write_company(out_dir / 'companies.sqlite', f'C{i:04d}', financials=scaled)
+
+    first = pd.read_csv(out_dir / f'{SHAREHOLDERS_PREFIX}{fiscal_years[-1]}.csv')['shareholder_name'][0]
+    return {
+        'year': int(year_values[len(year_values) // 2]),
+        'fiscal_year': fiscal_years[-1],
+        'holder_id': canonical_name(first).replace(' ', '-'),
+        'name': first.upper().replace(' ', '%20'),
+        'company': 'C0000' if companies else dataset_module.DEFAULT_COMPANY,
+    }
+
+
+def prepare_source(data_dir, source, company):
+    """Make `source` ('csv', 'store' or 'snapshot') the one the API reads from `data_dir`."""
+    if source in ('store', 'snapshot'):
+        shutil.copy(data_dir / 'companies.sqlite', data_dir / storage.STORE_FILE)
+        storage.import_csv(data_dir, company)
+    if source == 'snapshot':
+        import snapshot
+        snapshot.build_snapshot(data_dir, company)
+
+
+class TestClientTransport:
+    """Requests through the Flask test client: in-process, no sockets."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers={'Accept-Encoding': 'gzip'})
+        return response.status_code, len(response.get_data())
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """Requests over HTTP to a threaded werkzeug server bound to 127.0.0.1."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, path):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request(method, path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            return response.status, len(response.read())
+        finally:
+            conn.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def is_success(status):
+    """2xx, or 304 for a conditional request; anything else (a 404 or 400 included) is an error."""
+    return 200 <= status < 300 or status == 304
+
+
+def _timed(transport, method, path):
+    started = time.perf_counter()
+    status, size = transport.request(method, path)
+    return (time.perf_counter() - started) * 1000, status, size
+
+
+def run_cold(transport, data_dir, paths):
+    """First-request latency of each endpoint with every cache dropped before it."""
+    results = {}
+    for name, (method, path) in paths.items():
+        # A fresh, unwarmed Dataset: frames are read and derived results built by the request itself
+        current = dataset_module.get_dataset(data_dir)
+        dataset_module._datasets[Path(data_dir)] = dataset_module.Dataset(current.data_dir, current.version)
+        ms, status, _ = _timed(transport, method, path)
+        results[name] = {'ms': round(ms, 3), 'status': status}
+    return results
+
+
+def run_mix(transport, paths, mix, requests, concurrency, seed=0):
+    """Issue `requests` weighted requests from `concurrency` threads; returns per-endpoint samples."""
+    rng = random.Random(seed)
+    names = [name for name in mix if name in paths]
+    plan = rng.choices(names, weights=[mix[name] for name in names], k=requests)
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    def issue(name):
+        method, path = paths[name]
+        ms, status, size = _timed(transport, method, path)
+        return name, ms, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, ms, status in pool.map(issue, plan):
+            samples[name].append(ms)
+            if not is_success(status):
+                errors[name] += 1
+    elapsed = time.perf_counter() - started
+    return samples, errors, elapsed
+
+
+def summarize(samples, errors, elapsed):
+    report = {}
+    for name, values in samples.items():
+        if not values:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        report[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE, floor_ms=REGRESSION_FLOOR_MS):
+    """Endpoints whose warm p95 regressed past the baseline, as printable lines."""
+    regressions = []
+    for name, stats in report['warm'].items():
+        before = baseline.get('warm', {}).get(name)
+        if before is None:
+            continue
+        limit = max(before['p95_ms'] * (1 + tolerance), before['p95_ms'] + floor_ms)
+        if stats['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {stats['p95_ms']:.2f}ms > {limit:.2f}ms (baseline {before['p95_ms']:.2f}ms)")
+        if stats['errors'] > before.get('errors', 0):
+            regressions.append(f"{name}: {stats['errors']} errors (baseline {before.get('errors', 0)})")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'endpoint':<22} {'cold ms':>9} {'reqs':>6} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in sorted(report['warm'].items()):
+        cold = report['cold'].get(name, {}).get('ms', float('nan'))
+        print(f"{name:<22} {cold:>9.2f} {stats['requests']:>6} {stats['errors']:>4} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    print(f"total: {report['requests']} requests in {report['elapsed_s']:.2f}s = {report['rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test of the API against synthetic data.')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='read')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--transport', choices=('client', 'server'), default='client',
+                        help='Flask test client in-process, or HTTP to a local threaded server')
+    parser.add_argument('--source', choices=('csv', 'store', 'snapshot'), default='csv')
+    parser.add_argument('--years', type=int, default=60)
+    parser.add_argument('--right-issues', type=int, default=200000)
+    parser.add_argument('--holders', type=int, default=500)
+    parser.add_argument('--companies', type=int, default=50)
+    parser.add_argument('--data-dir', help='keep the synthetic data here instead of a temporary directory')
+    parser.add_argument('--baseline', help='fail if warm p95 regresses past this stored report')
+    parser.add_argument('--save-baseline', help='write this run\'s report here')
+    parser.add_argument('--output', help='write the full report as JSON')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix='loadtest-'))
+    try:
+        values = make_synthetic_data(data_dir, args.years, args.right_issues, args.holders, args.companies)
+        prepare_source(data_dir, args.source, dataset_module.DEFAULT_COMPANY)
+        import forecast_jobs
+        from app import create_app
+        app = create_app({'DATA_DIR': data_dir, 'DATA_RELOAD_INTERVAL': 3600,
+                          'FORECAST_QUEUE': data_dir / forecast_jobs.QUEUE_FILE})
+        paths = {name: (method, path.format(**values)) for name, (method, path) in ENDPOINTS.items()}
+        paths = {name: paths[name] for name in MIXES[args.mix] if name not in UNSUPPORTED_ENDPOINTS.get(args.source, ())}
+        transport = TestClientTransport(app) if args.transport == 'client' else ServerTransport(app)
+        try:
+            cold = run_cold(transport, data_dir, paths)
+            # Warm every cache once, then measure
+            for method, path in paths.values():
+                transport.request(method, path)
+            samples, errors, elapsed = run_mix(transport, paths, MIXES[args.mix], args.requests, args.concurrency)
+        finally:
+            transport.close()
+            # Let queued fits finish while their job file still exists
+            forecast_jobs.shutdown()
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'mix': args.mix, 'transport': args.transport, 'source': args.source,
+        'concurrency': args.concurrency, 'requests': args.requests,
+        'elapsed_s': round(elapsed, 3), 'rps': round(args.requests / elapsed, 1),
+        'cold': cold, 'warm': summarize(samples, errors, elapsed),
+    }
+    print_report(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        differing = [key for key in ('mix', 'transport', 'source', 'concurrency') if baseline.get(key) != report[key]]
+        if differing:
+            print(f"warning: baseline was run with different {', '.join(differing)}")
+        regressions = compare(report, baseline)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Prometheus metrics for the API, exported at /metrics.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory so every
+worker (and forecast pool process) writes its samples there and /metrics
+reports the sum over all of them, whichever worker answers the scrape.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+# Flask is imported inside the request-time functions: dataset imports this
+# module, and the extractor and other CLIs that import dataset never serve requests
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram
+    from prometheus_client import generate_latest, multiprocess
+except ImportError:  # optional: metrics are recorded nowhere and /metrics answers 503
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(9))          # 256 B .. 16 MB
+BUILD_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+FIT_BUCKETS = (0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labels, **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return kind(name, documentation, labels, **kwargs)
+
+
+REQUESTS = _metric(Counter, 'api_requests_total', 'HTTP requests by route and status',
+                   ['method', 'route', 'status'])
+REQUEST_LATENCY = _metric(Histogram, 'api_request_duration_seconds', 'Time to produce the response',
+                          ['method', 'route'], buckets=LATENCY_BUCKETS)
+RESPONSE_SIZE = _metric(Histogram, 'api_response_size_bytes', 'Response body size as sent (after compression)',
+                        ['route'], buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = _metric(Counter, 'cache_requests_total', 'Cache lookups by cache and result',
+                         ['cache', 'result'])
+DATASET_BUILD = _metric(Histogram, 'dataset_build_seconds',
+                        'Time to read a data frame or build a derived structure on a cache miss',
+                        ['name'], buckets=BUILD_BUCKETS)
+DATASET_EVICTIONS = _metric(Counter, 'dataset_evictions_total',
+                            'Company Datasets evicted from the LRU to stay within COMPANY_CACHE_BYTES', [])
+DATASET_LOAD = _metric(Histogram, 'dataset_load_seconds', 'Time to load and warm a data version',
+                       ['source'], buckets=BUILD_BUCKETS)
+FORECAST_FIT = _metric(Histogram, 'forecast_fit_seconds', 'Time spent fitting one forecast, in the pool or inline',
+                       ['engine'], buckets=FIT_BUCKETS)
+FORECASTS_IN_FLIGHT = _metric(Gauge, 'forecast_fits_in_flight', 'Forecast fits queued in the pool or running',
+                              ['engine'], **({'multiprocess_mode': 'livesum'} if prometheus_client else {}))
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+@contextmanager
+def forecast_fit(engine):
+    """Count a fit run in this process as in flight while it runs, and time it if it succeeds."""
+    FORECASTS_IN_FLIGHT.labels(engine).inc()
+    started = time.perf_counter()
+    try:
+        yield
+        FORECAST_FIT.labels(engine).observe(time.perf_counter() - started)
+    finally:
+        FORECASTS_IN_FLIGHT.labels(engine).dec()
+
+
+def metrics_response():
+    from flask import Response
+
+    if prometheus_client is None:
+        return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _route():
+    from flask import request
+
+    # The URL rule, not the path, so /api/shareholders/<holder_id>/history is one series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_timer():
+    from flask import g
+
+    g.request_started = time.perf_counter()
+
+
+def _record(response):
+    from flask import g, request
+
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    route = _route()
+    REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+    REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+    # Streamed responses (exports) have no length up front
+    if response.content_length is not None:
+        RESPONSE_SIZE.labels(route).observe(response.content_length)
+    return response
+
+
+def instrument(app):
+    """Record request metrics for every route of `app` and serve them at /metrics."""
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.add_url_rule('/metrics', 'metrics', metrics_response)
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)."""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
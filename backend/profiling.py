@@ -0,0 +1,163 @@
+"""
+On-demand profiling of live requests.
+
+A request is profiled when it carries `X-Profile: sample` or `X-Profile: cprofile`
+(or `?profile=sample|cprofile`) together with `X-Profile-Token` matching the
+PROFILE_TOKEN setting; without a token configured, on-demand profiling is off.
+Independently, PROFILE_SAMPLE_RATE profiles that fraction of all requests with
+the sampler in the background.
+
+- `sample` runs a sampling profiler (a thread reading the request thread's
+  stack every PROFILE_INTERVAL seconds) and stores folded stacks, the input
+  format of flamegraph.pl, speedscope and inferno.
+- `cprofile` runs cProfile and stores a pstats file (snakeviz, flameprof).
+
+Profiles are written to PROFILE_DIR; the response names the file in the
+X-Profile-Id header and it can be fetched from /debug/profiles/<id> with the
+same token.
+"""
+import cProfile
+import hmac
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from flask import abort, current_app, g, jsonify, request, send_from_directory
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_SUFFIXES = {'sample': '.folded', 'cprofile': '.prof'}
+# Stored profiles beyond this many are deleted, oldest first
+PROFILE_KEEP = 200
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._labels = {}   # code object -> frame label, so each sample only walks the stack
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})'
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        """Collapsed stacks, 'root;...;leaf count' per line."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _authorized():
+    token = current_app.config['PROFILE_TOKEN']
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Profile-Token', ''), token)
+
+
+def _requested_mode():
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    return mode if mode in PROFILE_MODES and _authorized() else None
+
+
+def _start():
+    mode = _requested_mode()
+    if mode is None:
+        rate = current_app.config['PROFILE_SAMPLE_RATE']
+        if not rate or random.random() >= rate:
+            return
+        mode = 'sample'
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(threading.get_ident(), current_app.config['PROFILE_INTERVAL'])
+        profiler.start()
+    g.profile = (mode, profiler, time.perf_counter())
+
+
+def _profile_name(mode):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIXES[mode]}"
+
+
+def _prune(directory):
+    profiles = sorted(directory.glob('*.*'), key=lambda p: p.stat().st_mtime)
+    for path in profiles[:-PROFILE_KEEP]:
+        path.unlink(missing_ok=True)
+
+
+def _finish(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    mode, profiler, started = profile
+    directory = Path(current_app.config['PROFILE_DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    name = _profile_name(mode)
+    if mode == 'cprofile':
+        profiler.disable()
+        profiler.dump_stats(directory / name)
+    else:
+        profiler.stop()
+        (directory / name).write_text(profiler.folded())
+    _prune(directory)
+    response.headers['X-Profile-Id'] = name
+    response.headers['X-Profile-Duration'] = f'{time.perf_counter() - started:.4f}'
+    return response
+
+
+def _discard(exc=None):
+    # after_request is skipped when a view raises; stop the profiler regardless
+    profile = g.pop('profile', None)
+    if profile is not None:
+        mode, profiler, _ = profile
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+
+def list_profiles():
+    if not _authorized():
+        abort(404)
+    directory = Path(current_app.config['PROFILE_DIR'])
+    paths = sorted(directory.glob('*.*'), key=lambda p: p.stat().st_mtime, reverse=True) if directory.exists() else []
+    return jsonify([{'id': p.name, 'bytes': p.stat().st_size} for p in paths])
+
+
+def get_profile(profile_id):
+    if not _authorized():
+        abort(404)
+    return send_from_directory(Path(current_app.config['PROFILE_DIR']).resolve(), profile_id, as_attachment=True)
+
+
+def instrument(app):
+    """Enable on-demand and background request profiling on `app` as its PROFILE_* settings allow."""
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_discard)
+    app.add_url_rule('/debug/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/debug/profiles/<profile_id>', 'get_profile', get_profile)
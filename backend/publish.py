@@ -0,0 +1,110 @@
+"""
+Atomic publishing of a new version of the cleaned data.
+
+Writers put their output in a staging directory inside data_cleaned, then
+`publish` moves each file into place with os.replace, refreshes the SQLite
+store and the Arrow snapshot, and finally replaces manifest.json. The API only
+sees a new data version when the manifest changes, so it never loads a
+half-written file or a mix of old and new files.
+
+Republish the files already in data_cleaned (e.g. after editing a CSV) with:
+    python publish.py --data-dir data_cleaned --company JKH
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+import snapshot
+from dataset import DATA_DIR, DEFAULT_COMPANY, MANIFEST_FILE, data_version, fingerprint
+from storage import import_csv
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = '.publish.lock'
+
+
+def staging_dir(data_dir=DATA_DIR):
+    """New empty directory for writers, on the same filesystem as `data_dir` so moves are atomic."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix='.staging-', dir=data_dir))
+
+
+def atomic_write_text(path, text):
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def publish_lock(data_dir=DATA_DIR, timeout=300):
+    """
+    Held by writers that read the published files, change them and publish,
+    so concurrent writers (e.g. several extraction workers) apply in turn.
+    An exclusive SQLite transaction serves as a portable cross-process lock.
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(data_dir / LOCK_FILE), timeout=timeout, isolation_level=None)
+    try:
+        conn.execute('BEGIN EXCLUSIVE')
+        yield
+    finally:
+        conn.close()
+
+
+def _write_manifest(data_dir, manifest):
+    atomic_write_text(Path(data_dir) / MANIFEST_FILE, json.dumps(manifest, indent=2))
+
+
+def publish(staging=None, data_dir=DATA_DIR, company=DEFAULT_COMPANY):
+    """
+    Move every file written to `staging` (if any) into `data_dir`, rebuild the
+    store and snapshot from the result and publish a new manifest. Staged CSVs
+    are parsed first; if any fails nothing is moved. Returns the new version.
+    """
+    data_dir = Path(data_dir)
+    staged = sorted(p for p in Path(staging).iterdir() if p.is_file()) if staging is not None else []
+    for path in staged:
+        if path.suffix == '.csv':
+            pd.read_csv(path)
+    if not (data_dir / MANIFEST_FILE).exists():
+        # Pin the current version so readers ignore the files changing below
+        _write_manifest(data_dir, {'version': data_version(data_dir), 'company': company, 'files': []})
+    moved = []
+    for path in staged:
+        os.replace(path, data_dir / path.name)
+        moved.append(path.name)
+    if staging is not None:
+        shutil.rmtree(staging, ignore_errors=True)
+    import_csv(data_dir, company)
+    if snapshot.PYARROW_AVAILABLE:
+        snapshot.build_snapshot(data_dir, company)
+    version = fingerprint(data_dir)
+    manifest = {'version': version, 'published_at': time.time(), 'company': company, 'files': moved}
+    _write_manifest(data_dir, manifest)
+    logger.info(f"Published data version {version} ({len(moved)} new files) in {data_dir}")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish the files in data_cleaned as a new data version.')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--company', default=DEFAULT_COMPANY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    publish(None, args.data_dir, args.company)
+
+
+if __name__ == '__main__':
+    main()
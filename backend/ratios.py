@@ -0,0 +1,153 @@
+import numpy as np
+
+from dataset import DEFAULT_COMPANY
+from financial_store import columns_to_records
+
+# Metrics with year-on-year growth (<metric>_yoy) and compound annual growth (<metric>_cagr_<n>y)
+GROWTH_METRICS = [
+    'total_revenue_lkr', 'net_profit_lkr', 'eps_lkr', 'operating_expenses_lkr', 'cost_of_sales_lkr',
+    'net_asset_per_share_lkr',
+]
+CAGR_METRICS = ['total_revenue_lkr', 'net_profit_lkr', 'eps_lkr', 'net_asset_per_share_lkr']
+CAGR_YEARS = (3, 5)
+
+
+def _growth_name(metric, suffix):
+    """'total_revenue_yoy' for 'total_revenue_lkr' and 'yoy'."""
+    return f"{metric[:-len('_lkr')]}_{suffix}"
+
+
+# Ratios derived from the stored LKR metrics, in column order; percentages unless noted
+RATIO_DEFINITIONS = {
+    'gross_margin': 'Revenue less cost of sales, % of revenue',
+    'operating_margin': 'Revenue less cost of sales and operating expenses, % of revenue',
+    'net_margin': 'Net profit, % of revenue',
+    'cost_of_sales_ratio': 'Cost of sales, % of revenue',
+    'operating_expense_ratio': 'Operating expenses, % of revenue',
+    'revenue_per_share_lkr': 'Revenue per share (LKR)',
+    'earnings_per_share_lkr': 'Net profit per share (LKR)',
+    'return_on_equity': 'EPS, % of net asset per share',
+    **{_growth_name(metric, 'yoy'): f'{metric} change on the previous year, %' for metric in GROWTH_METRICS},
+    **{_growth_name(metric, f'cagr_{n}y'): f'{metric} compound annual growth over {n} years, %'
+       for n in CAGR_YEARS for metric in CAGR_METRICS},
+}
+RATIOS = list(RATIO_DEFINITIONS)
+
+
+def _columns(frame, metrics):
+    """(len(frame), len(metrics)) float matrix of `metrics`, NaN for those the frame lacks."""
+    out = np.full((len(frame), len(metrics)), np.nan)
+    for i, metric in enumerate(metrics):
+        if metric in frame.columns:
+            out[:, i] = frame[metric].to_numpy(dtype=float)
+    return out
+
+
+def _divide(numerator, denominator, scale=1.0):
+    """Elementwise numerator / denominator * scale, NaN where the denominator is zero or missing."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = numerator / denominator * scale
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _lagged(years, values, lag):
+    """Rows of `values` for the year `lag` years before each of `years` (sorted), NaN where it is missing."""
+    target = years - lag
+    idx = np.minimum(np.searchsorted(years, target), len(years) - 1)
+    found = years[idx] == target
+    return np.where(found[:, None], values[idx], np.nan)
+
+
+def compute_ratios(frame):
+    """(sorted years, len(years) x len(RATIOS) matrix) for a normalized financials frame."""
+    frame = frame.sort_values('year', kind='mergesort')
+    years = frame['year'].to_numpy(dtype=np.int64)
+    matrix = np.full((len(years), len(RATIOS)), np.nan, order='F')
+    if not len(years):
+        return years, matrix
+    revenue, cost, opex, profit, shares, eps, nav = _columns(frame, [
+        'total_revenue_lkr', 'cost_of_sales_lkr', 'operating_expenses_lkr', 'net_profit_lkr', 'share_count',
+        'eps_lkr', 'net_asset_per_share_lkr',
+    ]).T
+    ratios = {
+        'gross_margin': _divide(revenue - cost, revenue, 100),
+        'operating_margin': _divide(revenue - cost - opex, revenue, 100),
+        'net_margin': _divide(profit, revenue, 100),
+        'cost_of_sales_ratio': _divide(cost, revenue, 100),
+        'operating_expense_ratio': _divide(opex, revenue, 100),
+        'revenue_per_share_lkr': _divide(revenue, shares),
+        'earnings_per_share_lkr': _divide(profit, shares),
+        'return_on_equity': _divide(eps, nav, 100),
+    }
+    growth = _columns(frame, GROWTH_METRICS)
+    previous = _lagged(years, growth, 1)
+    yoy = _divide(growth - previous, np.abs(previous), 100)
+    ratios.update((_growth_name(metric, 'yoy'), yoy[:, i]) for i, metric in enumerate(GROWTH_METRICS))
+    compounded = _columns(frame, CAGR_METRICS)
+    for n in CAGR_YEARS:
+        # Growth compounds only between two positive values
+        start = _lagged(years, compounded, n)
+        multiple = _divide(compounded, np.where(start > 0, start, np.nan))
+        cagr = (np.where(multiple > 0, multiple, np.nan) ** (1 / n) - 1) * 100
+        ratios.update((_growth_name(metric, f'cagr_{n}y'), cagr[:, i]) for i, metric in enumerate(CAGR_METRICS))
+    for i, name in enumerate(RATIOS):
+        matrix[:, i] = ratios[name]
+    return years, matrix
+
+
+class RatioView:
+    """
+    Derived ratios materialized once per data version: per company, a sorted
+    year array and a column-major year x ratio matrix. A query is two binary
+    searches on the years plus one column slice per requested ratio.
+    """
+
+    def __init__(self):
+        self._years = {}      # company -> sorted int64 year array
+        self._matrix = {}     # company -> float64 (years x RATIOS) matrix
+        self._index = {name: i for i, name in enumerate(RATIOS)}
+
+    def add(self, company, frame):
+        """Compute and store the ratios of `company`'s normalized financials frame."""
+        self._years[company], self._matrix[company] = compute_ratios(frame)
+
+    @property
+    def companies(self):
+        return list(self._years)
+
+    def ratios(self):
+        return list(RATIOS)
+
+    def query(self, company=DEFAULT_COMPANY, start=None, end=None, ratios=None):
+        """
+        {'year': [...], ratio: [...]} for `company`'s years in the inclusive range
+        [start, end], restricted to `ratios` (every ratio when None). NaN is None.
+        Raises KeyError for an unknown company or ratio.
+        """
+        years = self._years[company]
+        matrix = self._matrix[company]
+        ratios = RATIOS if ratios is None else ratios
+        unknown = [name for name in ratios if name not in self._index]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        lo = 0 if start is None else np.searchsorted(years, start, side='left')
+        hi = len(years) if end is None else np.searchsorted(years, end, side='right')
+        result = {'year': years[lo:hi].tolist()}
+        for name in ratios:
+            values = matrix[lo:hi, self._index[name]]
+            result[name] = [None if np.isnan(v) else v for v in values.tolist()]
+        return result
+
+
+def build_ratio_view(dataset):
+    view = RatioView()
+    if dataset.financials is not None:
+        view.add(dataset.company, dataset.financials)
+    return view
+
+
+def build_ratio_records(dataset):
+    """/api/ratios rows: year plus every ratio, from the Dataset's materialized view."""
+    view = dataset.derived('ratio_view', build_ratio_view)
+    return columns_to_records(view.query(dataset.company)) if dataset.company in view.companies else []
@@ -0,0 +1,374 @@
+"""
+Persistent queue of report extraction jobs and the worker processes that run them.
+
+Jobs live in a SQLite file, so queued work survives restarts. Each worker is a
+separate process that claims the oldest queued job, runs the extraction stages
+(see reports.STAGES), recording per-stage progress and any error on the job.
+Jobs of uploaded reports also merge the result into the cleaned data and
+publish it, which the API then picks up like any other new data version; jobs
+queued by reads only fill the result cache. A running job whose worker stops
+sending heartbeats is requeued.
+
+The web tier starts REPORT_WORKERS workers per web process on first use. To
+run them separately instead, set REPORT_WORKERS=0 for the web tier and start:
+    python report_jobs.py --workers 2
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from dataset import DATA_DIR, DEFAULT_COMPANY
+from reports import REPORT_CACHE_DIR, REPORTS_DIR, STAGES, extract_to_cache, list_reports, merge_result
+from reports import read_result, report_key
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILE = 'report_jobs.sqlite'
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 1))
+POLL_INTERVAL = 1.0
+HEARTBEAT_SECONDS = 10
+# A running job without a heartbeat for this long is assumed dead and requeued
+LEASE_SECONDS = 60
+# Attempts before a job whose worker keeps dying is failed
+MAX_ATTEMPTS = 3
+# A failed report is extracted again when requested after this many seconds
+RETRY_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    report_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    company TEXT NOT NULL,
+    year INTEGER,
+    status TEXT NOT NULL,
+    merge INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    progress TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_report_key ON jobs (report_key, created_at);
+"""
+
+_workers = []
+_lock = threading.Lock()
+
+
+def configure(workers=None):
+    """Override the number of worker processes started per web process."""
+    global REPORT_WORKERS
+    if workers is not None:
+        REPORT_WORKERS = int(workers)
+
+
+def connect(path):
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    # Queues created before jobs recorded whether to merge
+    if 'merge' not in [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]:
+        conn.execute('ALTER TABLE jobs ADD COLUMN merge INTEGER NOT NULL DEFAULT 0')
+    return conn
+
+
+def _state(row):
+    if row is None:
+        return None
+    return {
+        'id': row['id'],
+        'report': Path(row['path']).stem,
+        'key': row['report_key'],
+        'company': row['company'],
+        'year': row['year'],
+        'status': row['status'],
+        'merge': bool(row['merge']),
+        'stage': row['stage'],
+        'progress': json.loads(row['progress']),
+        'error': row['error'],
+        'attempts': row['attempts'],
+        'created_at': row['created_at'],
+        'started_at': row['started_at'],
+        'finished_at': row['finished_at'],
+    }
+
+
+def enqueue(queue_path, pdf_path, key, company=DEFAULT_COMPANY, year=None, rerun_done=False, merge=False):
+    """
+    Queue extraction of the report at `pdf_path` (content hash `key`) and return
+    the job id. Only a `merge` job folds the result into the cleaned data and
+    publishes it; other jobs just fill the result cache. A queued or running
+    job for the same report is reused (and upgraded to merge if asked), as is a
+    finished one (unless `rerun_done`) or one that failed less than
+    RETRY_SECONDS ago, provided it merges when `merge` is asked for.
+    """
+    now = time.time()
+    conn = connect(queue_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            'SELECT id, status, merge, updated_at FROM jobs WHERE report_key = ? ORDER BY created_at DESC LIMIT 1',
+            (key,)
+        ).fetchone()
+        if row is not None and row['status'] in ('queued', 'running'):
+            if merge and not row['merge']:
+                conn.execute('UPDATE jobs SET merge = 1, company = ? WHERE id = ?', (company, row['id']))
+            conn.execute('COMMIT')
+            return row['id']
+        if row is not None and (row['merge'] or not merge) and (
+            (row['status'] == 'done' and not rerun_done)
+            or (row['status'] == 'failed' and now - row['updated_at'] < RETRY_SECONDS)
+        ):
+            conn.execute('COMMIT')
+            return row['id']
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            'INSERT INTO jobs (id, report_key, path, company, year, status, merge, created_at, updated_at) '
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, key, str(pdf_path), company, year, int(merge), now, now)
+        )
+        conn.execute('COMMIT')
+        return job_id
+    finally:
+        conn.close()
+
+
+def get_job(queue_path, job_id):
+    conn = connect(queue_path)
+    try:
+        return _state(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def latest_job(queue_path, key):
+    conn = connect(queue_path)
+    try:
+        return _state(conn.execute(
+            'SELECT * FROM jobs WHERE report_key = ? ORDER BY created_at DESC LIMIT 1', (key,)
+        ).fetchone())
+    finally:
+        conn.close()
+
+
+def list_jobs(queue_path, status=None, limit=50):
+    """Most recent jobs first, optionally only those with `status`."""
+    conn = connect(queue_path)
+    try:
+        where, params = (' WHERE status = ?', [status]) if status else ('', [])
+        rows = conn.execute(f'SELECT * FROM jobs{where} ORDER BY created_at DESC LIMIT ?', params + [limit])
+        return [_state(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def claim(queue_path, worker):
+    """Mark the oldest queued job as running on `worker` and return it, or None if there is none."""
+    now = time.time()
+    conn = connect(queue_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        # Jobs of workers that died mid-run go back on the queue, or fail once they have used their attempts
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Extraction worker stopped responding', "
+            "updated_at = ?, finished_at = ? WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+            (now, now, now - LEASE_SECONDS, MAX_ATTEMPTS)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND updated_at < ?",
+            (now - LEASE_SECONDS,)
+        )
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', stage = ?, error = NULL, attempts = attempts + 1, worker = ?, "
+            'started_at = ?, updated_at = ? WHERE id = ?',
+            (STAGES[0], worker, now, now, row['id'])
+        )
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+        conn.execute('COMMIT')
+        # The worker also needs the file, which the public state leaves out
+        return dict(_state(job), path=job['path'])
+    finally:
+        conn.close()
+
+
+def _update(queue_path, job_id, **fields):
+    fields['updated_at'] = time.time()
+    conn = connect(queue_path)
+    try:
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+            list(fields.values()) + [job_id]
+        )
+    finally:
+        conn.close()
+
+
+def _finish_unless_merging(queue_path, job_id, year):
+    """
+    Mark an extracted job done unless it has to merge; returns whether it did.
+    enqueue may upgrade a running job to merge, so check and finish in one statement.
+    """
+    now = time.time()
+    conn = connect(queue_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'done', stage = NULL, year = ?, updated_at = ?, finished_at = ? "
+            'WHERE id = ? AND merge = 0',
+            (year, now, now, job_id)
+        )
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def _heartbeat(queue_path, job_id, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        _update(queue_path, job_id)
+
+
+def run_job(queue_path, job, cache_dir, data_dir):
+    """
+    Run one claimed job, recording progress, the outcome and any error on it.
+    A merge job reuses a cached result for the same report and year.
+    """
+    progress = {}
+    started = [time.perf_counter()]
+
+    def record(stage, **info):
+        now = time.perf_counter()
+        progress[stage] = {'seconds': round(now - started[0], 3), **info}
+        started[0] = now
+        following = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else None
+        _update(queue_path, job['id'], stage=following, progress=json.dumps(progress))
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(queue_path, job['id'], stop), daemon=True).start()
+    try:
+        result = read_result(cache_dir, job['key']) if job['merge'] else None
+        if result is not None and job['year'] in (None, result.get('year')):
+            record('cache', reused=True)
+        else:
+            result = extract_to_cache(job['path'], cache_dir, job['key'], job['year'], record)
+        if _finish_unless_merging(queue_path, job['id'], result['year']):
+            logger.info(f"Report job {job['id']} ({job['report']}) extracted")
+            return True
+        merge_result(result, data_dir, job['company'], record)
+    except Exception as e:
+        logger.error(f"Report job {job['id']} ({job['report']}) failed: {e}")
+        _update(queue_path, job['id'], status='failed', error=f'{type(e).__name__}: {e}', finished_at=time.time())
+        return False
+    finally:
+        stop.set()
+    _update(queue_path, job['id'], status='done', year=result['year'], finished_at=time.time())
+    logger.info(f"Report job {job['id']} ({job['report']}) done")
+    return True
+
+
+def worker_loop(queue_path, cache_dir, data_dir, stop=None):
+    """Claim and run jobs until `stop` is set (forever when None)."""
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    while stop is None or not stop.is_set():
+        job = claim(queue_path, worker)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(queue_path, job, cache_dir, data_dir)
+
+
+def _worker_main(queue_path, cache_dir, data_dir):
+    logging.basicConfig(level=logging.INFO)
+    worker_loop(queue_path, cache_dir, data_dir)
+
+
+def start_workers(queue_path, cache_dir, data_dir, count, daemon=True):
+    # 'spawn' keeps the children clear of the Flask threads' locks
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    for _ in range(count):
+        process = context.Process(
+            target=_worker_main, args=(str(queue_path), str(cache_dir), str(data_dir)),
+            name='report-worker', daemon=daemon
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def ensure_workers(queue_path, cache_dir, data_dir):
+    """Keep REPORT_WORKERS worker processes running for this web process, restarting any that died."""
+    with _lock:
+        _workers[:] = [process for process in _workers if process.is_alive()]
+        missing = REPORT_WORKERS - len(_workers)
+        if missing > 0:
+            _workers.extend(start_workers(queue_path, cache_dir, data_dir, missing))
+
+
+def report_status(pdf_path, cache_dir, queue_path, queue=True):
+    """
+    {'report', 'file', 'key', 'status', ...} for one report: 'ready' with the
+    cached result under 'data', otherwise the state of its extraction job
+    ('pending' with stage and progress, or 'failed' with the error), queueing
+    one first when `queue` is set.
+    """
+    pdf_path = Path(pdf_path)
+    key = report_key(pdf_path)
+    state = {'report': pdf_path.stem, 'file': pdf_path.name, 'key': key}
+    result = read_result(cache_dir, key)
+    if result is not None:
+        state.update(status='ready', year=result.get('year'), data=result)
+        return state
+    if queue:
+        enqueue(queue_path, pdf_path, key, rerun_done=True)
+    job = latest_job(queue_path, key)
+    if job is None:
+        state['status'] = 'missing'
+    elif job['status'] == 'failed':
+        state.update(status='failed', job=job['id'], error=job['error'])
+    else:
+        state.update(status='pending', job=job['id'], stage=job['stage'], progress=job['progress'])
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run report extraction workers against the job queue.')
+    parser.add_argument('--workers', type=int, default=max(REPORT_WORKERS, 1))
+    parser.add_argument('--queue', default=str(DATA_DIR / QUEUE_FILE))
+    parser.add_argument('--cache-dir', default=str(REPORT_CACHE_DIR))
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--scan', metavar='REPORTS_DIR', nargs='?', const=str(REPORTS_DIR),
+                        help='first queue every report in this directory without a cached result')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.scan:
+        for pdf_path in list_reports(args.scan):
+            key = report_key(pdf_path)
+            if read_result(args.cache_dir, key) is None:
+                enqueue(args.queue, pdf_path, key, rerun_done=True)
+    processes = start_workers(args.queue, args.cache_dir, args.data_dir, args.workers, daemon=False)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Per-report extraction results, keyed by the report's content hash.
+
+Each annual report PDF is parsed at most once, by an extraction worker (see
+report_jobs.py): the extractor's table reader and miners run on it and the
+result is written to <cache dir>/<sha256>.json, then merged into the cleaned
+data and published. Readers only ever look in the cache, so PDF parsing never
+runs in a web request.
+
+Fill the cache for every report in a directory with:
+    python reports.py --reports-dir data --cache-dir data_cleaned/reports
+"""
+import argparse
+import hashlib
+import json
+import logging
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from dataset import DATA_DIR, FINANCIALS_FILE, RIGHT_ISSUES_FILE, SHAREHOLDERS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+REPORTS_DIR = BASE_DIR / 'data'
+REPORT_CACHE_DIR = DATA_DIR / 'reports'
+
+# Extraction stages in the order they run, as reported in job progress
+STAGES = ('year', 'tables', 'financial_metrics', 'shareholders', 'right_issues', 'cache', 'publish')
+
+_hashes = {}       # path -> (mtime_ns, size, content hash)
+
+
+def report_key(path):
+    """sha256 of the report's bytes; recomputed only when its size or mtime changes."""
+    path = Path(path)
+    stat = path.stat()
+    cached = _hashes.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    key = digest.hexdigest()
+    _hashes[path] = (stat.st_mtime_ns, stat.st_size, key)
+    return key
+
+
+def cache_path(cache_dir, key):
+    return Path(cache_dir) / f'{key}.json'
+
+
+def read_result(cache_dir, key):
+    """The cached extraction result for content hash `key`, or None."""
+    try:
+        return json.loads(cache_path(cache_dir, key).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def list_reports(reports_dir):
+    return sorted(Path(reports_dir).glob('*.pdf'))
+
+
+def fiscal_year(year):
+    """'2021_22' for the fiscal year ending in March `year`, as in the shareholder file names."""
+    return f'{year - 1}_{str(year)[-2:]}'
+
+
+def _jsonable(value):
+    # numpy scalars from the miners
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _noop_progress(stage, **info):
+    pass
+
+
+def extract_report(pdf_path, year=None, progress=_noop_progress):
+    """
+    Parse one report: {'year', 'tables', 'financial_metrics', 'shareholders',
+    'right_issues'}. `progress(stage, **counts)` is called as each stage ends.
+    """
+    from extract_data import (
+        determine_year, extract_tables_from_pdf, find_financial_metrics_all_years, find_right_issues,
+        find_shareholders_data, get_main_year_from_filename
+    )
+
+    year = year or get_main_year_from_filename(pdf_path) or determine_year(str(pdf_path))
+    if year is None:
+        raise ValueError(f'Could not determine the report year of {Path(pdf_path).name}')
+    progress('year', year=year)
+    tables = extract_tables_from_pdf(str(pdf_path))
+    progress('tables', count=len(tables))
+    metrics = find_financial_metrics_all_years(tables, main_year=year)
+    progress('financial_metrics', count=len(metrics))
+    shareholders = find_shareholders_data(tables, year)
+    progress('shareholders', count=len(shareholders))
+    right_issues = find_right_issues(tables, year)
+    progress('right_issues', count=len(right_issues))
+    return {
+        'year': year,
+        'tables': len(tables),
+        'financial_metrics': metrics,
+        'shareholders': shareholders,
+        'right_issues': right_issues,
+    }
+
+
+def extract_to_cache(pdf_path, cache_dir, key=None, year=None, progress=_noop_progress):
+    """Extract `pdf_path` and write its result to the cache atomically; returns the result."""
+    from publish import atomic_write_text
+
+    key = key or report_key(pdf_path)
+    started = time.perf_counter()
+    result = extract_report(pdf_path, year, progress)
+    result.update({
+        'report': Path(pdf_path).stem,
+        'key': key,
+        'extracted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seconds': round(time.perf_counter() - started, 3),
+    })
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    atomic_write_text(cache_path(cache_dir, key), json.dumps(result, default=_jsonable))
+    progress('cache')
+    return result
+
+
+def _merge_financials(data_dir, staging, result):
+    # Like extract_pdf_tables, only the report's own year is taken from it
+    rows = [m for m in result['financial_metrics'] if m.get('year') == result['year']]
+    if not rows:
+        return 0
+    path = data_dir / FINANCIALS_FILE
+    existing = pd.read_csv(path) if path.exists() else pd.DataFrame(columns=['year'])
+    new = pd.DataFrame(rows).drop(columns=['events', 'scale'], errors='ignore').groupby('year').first()
+    merged = new.combine_first(existing.set_index('year')).reset_index()
+    merged[list(existing.columns) + [c for c in merged.columns if c not in existing.columns]] \
+        .sort_values('year').to_csv(staging / FINANCIALS_FILE, index=False)
+    return len(new.columns)
+
+
+def _merge_shareholders(staging, result):
+    if not result['shareholders']:
+        return 0
+    holders = pd.DataFrame(result['shareholders'])
+    for year, group in holders.groupby('year'):
+        group.sort_values('rank').head(20)[['rank', 'shareholder_name', 'ownership_percentage']].to_csv(
+            staging / f'{SHAREHOLDERS_PREFIX}{fiscal_year(int(year))}.csv', index=False
+        )
+    return len(holders)
+
+
+def _merge_right_issues(data_dir, staging, result):
+    if not result['right_issues']:
+        return 0
+    path = data_dir / RIGHT_ISSUES_FILE
+    issues = pd.DataFrame(result['right_issues'])
+    if path.exists():
+        existing = pd.read_csv(path)
+        issues = pd.concat([existing[existing['year'] != result['year']], issues], ignore_index=True)
+    issues.sort_values('year', kind='stable').to_csv(staging / RIGHT_ISSUES_FILE, index=False)
+    return len(result['right_issues'])
+
+
+def merge_result(result, data_dir, company, progress=_noop_progress):
+    """
+    Fold one report's extraction into the cleaned data and publish it: its
+    year's metrics replace stored values, its shareholder lists replace those
+    fiscal years and its right issues replace that year's. Returns the version.
+    """
+    from publish import publish, publish_lock, staging_dir
+
+    data_dir = Path(data_dir)
+    with publish_lock(data_dir):
+        staging = staging_dir(data_dir)
+        try:
+            counts = {
+                'metrics': _merge_financials(data_dir, staging, result),
+                'shareholders': _merge_shareholders(staging, result),
+                'right_issues': _merge_right_issues(data_dir, staging, result),
+            }
+            version = publish(staging, data_dir, company)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    progress('publish', version=version, **counts)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract every report PDF that has no cached result yet.')
+    parser.add_argument('--reports-dir', default=str(REPORTS_DIR))
+    parser.add_argument('--cache-dir', default=str(REPORT_CACHE_DIR))
+    parser.add_argument('--force', action='store_true', help='re-extract reports that are already cached')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for pdf_path in list_reports(args.reports_dir):
+        key = report_key(pdf_path)
+        if args.force or read_result(args.cache_dir, key) is None:
+            logger.info(f"Extracting {pdf_path.name}")
+            extract_to_cache(pdf_path, args.cache_dir, key)
+
+
+if __name__ == '__main__':
+    main()
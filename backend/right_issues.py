@@ -0,0 +1,115 @@
+import base64
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+RIGHT_ISSUE_FIELDS = ('year', 'ratio', 'issue_price')
+MAX_PAGE_SIZE = 1000
+
+
+class RightIssueIndex:
+    """
+    Right issues sorted by year with per-column arrays, built once per data
+    version. A year range is two binary searches; price bounds filter only the
+    rows inside it, and pages are sliced from the matching positions.
+    """
+
+    def __init__(self, df):
+        df = df.sort_values('year', kind='mergesort').reset_index(drop=True)
+        self.fields = [field for field in RIGHT_ISSUE_FIELDS if field in df.columns]
+        self.years = df['year'].to_numpy(dtype=np.int64)
+        self.prices = pd.to_numeric(df['issue_price'], errors='coerce').to_numpy(dtype=float)
+        # Object columns hold plain Python values (None for NaN) ready for JSON
+        self.columns = {
+            field: df[field].astype(object).where(df[field].notna(), None).to_numpy()
+            for field in self.fields
+        }
+        self.columns['year'] = np.array([int(y) for y in self.years], dtype=object)
+
+    def __len__(self):
+        return len(self.years)
+
+    def select(self, year_from=None, year_to=None, min_price=None, max_price=None):
+        """Row positions matching the filters, in year order."""
+        lo = 0 if year_from is None else np.searchsorted(self.years, year_from, side='left')
+        hi = len(self.years) if year_to is None else np.searchsorted(self.years, year_to, side='right')
+        positions = np.arange(lo, hi)
+        if min_price is not None or max_price is not None:
+            prices = self.prices[lo:hi]
+            mask = ~np.isnan(prices)
+            if min_price is not None:
+                mask &= prices >= min_price
+            if max_price is not None:
+                mask &= prices <= max_price
+            positions = positions[mask]
+        return positions
+
+    def rows(self, positions, fields=None):
+        """Rows at `positions` as dicts restricted to `fields`."""
+        fields = fields or self.fields
+        columns = [self.columns[field][positions] for field in fields]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+def build_right_issue_index(dataset):
+    if dataset.right_issues is None:
+        return None
+    return RightIssueIndex(dataset.right_issues)
+
+
+def build_right_issue_records(dataset):
+    """Every right issue as stored in right_issues.csv, NaN mapped to None."""
+    index = dataset.derived('right_issue_index', build_right_issue_index)
+    return index.rows(np.arange(len(index)))
+
+
+def build_right_issue_summary(dataset):
+    """Per-year right issue counts and price statistics, as charted by the RightIssues panel."""
+    df = dataset.right_issues
+    if df is None:
+        return []
+    prices = pd.to_numeric(df['issue_price'], errors='coerce')
+    priced = prices.where(prices != 0)
+    summary = pd.DataFrame({'year': df['year'], 'price': priced}).groupby('year')['price'].agg(
+        ['size', 'count', 'mean', 'min', 'max']
+    )
+    return [
+        {
+            'year': int(year),
+            'total': int(row['size']),
+            'count': int(row['count']),
+            'avg_price': None if pd.isna(row['mean']) else float(row['mean']),
+            'min_price': None if pd.isna(row['min']) else float(row['min']),
+            'max_price': None if pd.isna(row['max']) else float(row['max']),
+        }
+        for year, row in summary.iterrows()
+    ]
+
+
+def cursor_scope(*parts):
+    """Short hash of the company and filters a cursor was issued for."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+
+
+def encode_cursor(version, offset, scope=''):
+    return base64.urlsafe_b64encode(f'{version}:{scope}:{offset}'.encode()).decode()
+
+
+def decode_cursor(cursor, version, scope=''):
+    """
+    Return the offset stored in `cursor`; raises ValueError if it is malformed,
+    stale, or was issued for a different company or set of filters (`scope`).
+    """
+    try:
+        cursor_version, cursor_scope, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        offset = int(offset)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    if cursor_version != version:
+        raise ValueError('Cursor refers to an older version of the data; restart pagination')
+    if cursor_scope != scope:
+        raise ValueError('Cursor was issued for different filters; restart pagination')
+    return offset
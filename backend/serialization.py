@@ -0,0 +1,175 @@
+import gzip
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+from dataset import frame_records
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+RESPONSE_FORMATS = ('records', 'columns')
+
+
+def _default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, pd.DataFrame):
+        return frame_records(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _without_nan(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _without_nan(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_nan(v) for v in value]
+    return value
+
+
+def dumps(payload):
+    """Serialize `payload` to JSON bytes; NaN becomes null and NumPy/pandas values are handled."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        text = json.dumps(payload, default=_default, allow_nan=False, separators=(',', ':'))
+    except ValueError:
+        text = json.dumps(_without_nan(payload), default=_default, allow_nan=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def to_columns(payload):
+    """Columnar shape {field: [values...]} for a list of records; other payloads are returned unchanged."""
+    if isinstance(payload, pd.DataFrame):
+        return {column: payload[column].tolist() for column in payload.columns}
+    if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        return payload
+    fields = list(dict.fromkeys(key for row in payload for key in row))
+    return {field: [row.get(field) for row in payload] for field in fields}
+
+
+def _accepted_codings(header):
+    """{coding: q} from an Accept-Encoding header; a coding without a valid q value gets 1."""
+    accepted = {}
+    for item in header.lower().split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    pass
+        accepted['gzip' if coding == 'x-gzip' else coding] = q
+    return accepted
+
+
+def negotiate_encoding():
+    """
+    Best content coding the client accepts: 'br', 'gzip' or None. The coding
+    with the highest q value wins, br on a tie; q=0 refuses a coding, and `*`
+    stands for any coding not listed.
+    """
+    accepted = _accepted_codings(request.headers.get('Accept-Encoding', ''))
+    wildcard = accepted.get('*', 0.0)
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def requested_format():
+    fmt = request.args.get('format', 'records')
+    return fmt if fmt in RESPONSE_FORMATS else 'records'
+
+
+def compress(body, encoding):
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+
+
+def encode_payload(payload, fmt='records', encoding=None):
+    """Return (body bytes, applied content coding) for `payload` in the given shape."""
+    if isinstance(payload, pd.DataFrame) and fmt == 'records':
+        payload = frame_records(payload)
+    elif fmt == 'columns':
+        payload = to_columns(payload)
+    return compress(dumps(payload), encoding)
+
+
+def _response(body, content_encoding, status=200, etag=None):
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if etag:
+        response.headers['ETag'] = etag
+    return response
+
+
+def json_response(payload, status=200):
+    """Serialize and compress a payload that is not worth caching (e.g. one page of results)."""
+    body, content_encoding = encode_payload(payload, requested_format(), negotiate_encoding())
+    return _response(body, content_encoding, status)
+
+
+def cached_response(dataset, name, build):
+    """
+    Response for `build(dataset)`, whose encoded and compressed bytes are cached
+    on the Dataset, so they are produced once per data version, shape and coding.
+    Supports conditional requests through an ETag derived from the data version.
+    """
+    fmt = requested_format()
+    encoding = negotiate_encoding()
+    etag = f'"{dataset.company}-{dataset.version}-{name}-{fmt}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return _response(b'', None, 304, etag)
+
+    body, content_encoding = cached_body(dataset, name, build, fmt, encoding)
+    return _response(body, content_encoding, etag=etag)
+
+
+def cached_body(dataset, name, build, fmt='records', encoding=None):
+    """(body, content coding) of `build(dataset)` in one shape and coding, encoded once per Dataset."""
+    def encode(ds):
+        return encode_payload(ds.derived(name, build), fmt, encoding)
+    return dataset.derived(f'response:{name}:{fmt}:{encoding}', encode)
+
+
+def precompute_responses(dataset, name, build, formats=('records',)):
+    """Encode `build(dataset)` ahead of time for every shape in `formats` and every coding offered."""
+    encodings = [None, 'gzip'] + (['br'] if brotli is not None else [])
+    for fmt in formats:
+        for encoding in encodings:
+            cached_body(dataset, name, build, fmt, encoding)
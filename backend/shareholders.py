@@ -0,0 +1,191 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from dataset import frame_records
+
+# Words with several common spellings, folded to one form before matching
+TOKEN_FOLDS = {
+    '&': 'and',
+    'ltd': 'limited',
+    'co': 'company',
+    'corp': 'corporation',
+    'pvt': 'private',
+    'a/c': 'account',
+    'acc': 'account',
+}
+# Legal-form words dropped from the end of a name ('... Limited' == '... Ltd' == '...')
+LEGAL_SUFFIXES = {'limited', 'plc', 'inc', 'llc', 'company', 'corporation'}
+# Fuzzy matches must share at least this fraction of their tokens (Jaccard)
+MATCH_THRESHOLD = 0.85
+# Number of rarest tokens whose blocks supply fuzzy-match candidates
+BLOCKING_TOKENS = 2
+
+
+def canonical_name(name):
+    """
+    Canonical key for a shareholder name: case, whitespace, punctuation and
+    common suffix/abbreviation spellings folded, e.g. 'HWIC  Asia Fund' and
+    'HWIC Asia Fund', or 'Paints & General Industries Ltd' and
+    'Paints and General Industries Limited', map to the same key. Trailing
+    legal-form words are dropped.
+    """
+    text = str(name).lower().replace('&', ' & ')
+    tokens = []
+    for token in text.split():
+        # '/' and '&' survive until after folding so 'a/c' and '&' are recognised
+        token = re.sub(r"[^\w/&]", '', token)
+        token = TOKEN_FOLDS.get(token, token).replace('/', '')
+        if token:
+            tokens.append(token)
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+class ShareholderIndex:
+    """
+    Resolves shareholder names to stable ids. Exact canonical keys resolve with
+    one dict lookup; other names are compared only against holders sharing one
+    of their rarest tokens (token blocking), never against the whole register.
+    """
+
+    def __init__(self):
+        self._ids = {}                      # canonical key -> shareholder id
+        self._tokens = {}                   # shareholder id -> token set
+        self._blocks = defaultdict(set)     # token -> shareholder ids
+        self._names = defaultdict(list)     # shareholder id -> spellings seen, oldest first
+        self._history = defaultdict(list)   # shareholder id -> history rows
+        self.entries = []                   # (id, fiscal_year, ownership_percentage, rank)
+
+    def resolve(self, name, remember=False):
+        """
+        Return the id for `name`, or None if no known holder matches. With
+        `remember`, a fuzzy match is stored so the spelling resolves exactly next time.
+        """
+        key = canonical_name(name)
+        holder_id = self._ids.get(key)
+        if holder_id is not None or not key:
+            return holder_id
+        tokens = set(key.split())
+        # Tokens no holder has are no use for blocking; ties break by token so the choice is stable
+        known = [t for t in tokens if self._blocks.get(t)]
+        rarest = sorted(known, key=lambda t: (len(self._blocks[t]), t))[:BLOCKING_TOKENS]
+        best_id, best_score = None, 0.0
+        for candidate in set().union(*(self._blocks.get(t, set()) for t in rarest)):
+            other = self._tokens[candidate]
+            score = len(tokens & other) / len(tokens | other)
+            if score > best_score:
+                best_id, best_score = candidate, score
+        if best_score >= MATCH_THRESHOLD:
+            if remember:
+                self._ids[key] = best_id
+            return best_id
+        return None
+
+    def add(self, name, fiscal_year=None, ownership_percentage=None, rank=None):
+        """Resolve `name`, registering a new holder if needed, and record its holding."""
+        holder_id = self.resolve(name, remember=True)
+        if holder_id is None:
+            key = canonical_name(name)
+            holder_id = key.replace(' ', '-')
+            self._ids[key] = holder_id
+            self._tokens[holder_id] = set(key.split())
+            for token in self._tokens[holder_id]:
+                self._blocks[token].add(holder_id)
+        name = ' '.join(str(name).split())
+        if name not in self._names[holder_id]:
+            self._names[holder_id].append(name)
+        if fiscal_year is not None:
+            self._history[holder_id].append({
+                'fiscal_year': fiscal_year,
+                'ownership_percentage': ownership_percentage,
+                'rank': rank,
+                'shareholder_name': name,
+            })
+            self.entries.append((holder_id, fiscal_year, ownership_percentage, rank))
+        return holder_id
+
+    def display_name(self, holder_id):
+        """Most recent spelling of the holder's name."""
+        return self._names[holder_id][-1]
+
+    def history(self, holder_id):
+        """The holder's names and per-year holdings, or None for an unknown id."""
+        if holder_id not in self._tokens:
+            return None
+        return {
+            'shareholder_id': holder_id,
+            'shareholder_name': self.display_name(holder_id),
+            'names': list(self._names[holder_id]),
+            'history': list(self._history[holder_id]),
+        }
+
+
+def build_shareholder_index(dataset):
+    """Index every holder of every fiscal year; ranks follow ownership within each year."""
+    index = ShareholderIndex()
+    for fiscal_year, df in dataset.shareholders.items():
+        ranks = df['ownership_percentage'].rank(ascending=False, method='min')
+        for name, pct, rank in zip(df['shareholder_name'], df['ownership_percentage'], ranks):
+            index.add(
+                name, fiscal_year,
+                None if pd.isna(pct) else float(pct),
+                None if pd.isna(rank) else int(rank),
+            )
+    return index
+
+
+def build_all_shareholders(dataset):
+    """Every fiscal year's shareholders as one flat list, each row tagged with its fiscal_year."""
+    rows = []
+    for fiscal_year, df in dataset.shareholders.items():
+        rows.extend(frame_records(df.assign(fiscal_year=fiscal_year)))
+    return rows
+
+
+def build_shareholders_by_year(dataset):
+    """{fiscal_year: rows} exactly as stored in each shareholders_<fiscal_year>.csv."""
+    return {fiscal_year: frame_records(df) for fiscal_year, df in dataset.shareholders.items()}
+
+
+def build_ownership_matrix(dataset):
+    """
+    Shareholder x fiscal-year ownership matrix with per-year rank (1 = largest
+    holding) and year-over-year change in percentage points. Holders are joined
+    across years by canonical identity, so spelling variants share one row.
+    Each holder's series are lists aligned with `years`, null where not listed.
+    """
+    index = dataset.derived('shareholder_index', build_shareholder_index)
+    years = list(dataset.shareholders)
+    if not index.entries:
+        return {'years': [], 'shareholders': []}
+    long = pd.DataFrame(index.entries, columns=['shareholder_id', 'fiscal_year', 'ownership_percentage', 'rank'])
+    matrix = long.pivot_table(
+        index='shareholder_id', columns='fiscal_year',
+        values='ownership_percentage', aggfunc='sum'
+    ).reindex(columns=years)
+    # Largest holders in the latest year first, earlier years breaking ties
+    matrix = matrix.sort_values(by=years[::-1], ascending=False, na_position='last')
+
+    ownership = matrix.to_numpy(dtype=float)
+    rank = matrix.rank(axis=0, ascending=False, method='min').to_numpy()
+    delta = np.full_like(ownership, np.nan)
+    delta[:, 1:] = ownership[:, 1:] - ownership[:, :-1]
+
+    shareholders = []
+    for i, holder_id in enumerate(matrix.index):
+        shareholders.append({
+            'shareholder_id': holder_id,
+            'shareholder_name': index.display_name(holder_id),
+            'ownership_percentage': _nullable(ownership[i]),
+            'rank': [None if np.isnan(r) else int(r) for r in rank[i]],
+            'yoy_change': _nullable(np.round(delta[i], 4)),
+        })
+    return {'years': years, 'shareholders': shareholders}
+
+
+def _nullable(values):
+    return [None if np.isnan(v) else float(v) for v in values]
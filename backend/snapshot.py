@@ -0,0 +1,151 @@
+"""
+Memory-mapped Arrow IPC snapshot of the cleaned data.
+
+The extraction step writes one Arrow file per table under
+data_cleaned/snapshot/<company>/. The API maps them read-only instead of
+parsing anything: numeric columns are stored without validity bitmaps (NaN is
+kept as a value), so pandas and NumPy read them straight from the mapping, and
+every worker process shares the same physical pages through the page cache.
+
+Rebuild the snapshot from the CSVs or the SQLite store with:
+    python snapshot.py --data-dir data_cleaned --company JKH
+"""
+import argparse
+import importlib
+import importlib.util
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Optional: without pyarrow the API falls back to the SQLite store or the CSVs.
+# Only its presence is checked at import; the module is loaded on first use.
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+SNAPSHOT_DIR = 'snapshot'
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_dir(data_dir, company):
+    return Path(data_dir) / SNAPSHOT_DIR / company
+
+
+def has_snapshot(data_dir, company):
+    """True when pyarrow is installed and a snapshot of `company` exists under `data_dir`."""
+    return PYARROW_AVAILABLE and (snapshot_dir(data_dir, company) / 'financials.arrow').exists()
+
+
+def _pyarrow():
+    pa = importlib.import_module('pyarrow')
+    importlib.import_module('pyarrow.ipc')
+    return pa
+
+
+def _array(pa, values):
+    if pd.api.types.is_numeric_dtype(values):
+        # Built from NumPy, so NaN stays a value and the column has no null bitmap
+        return pa.array(values.to_numpy())
+    return pa.array([None if pd.isna(v) else str(v) for v in values], type=pa.string())
+
+
+def _write_table(df, path):
+    pa = _pyarrow()
+    table = pa.table({column: _array(pa, df[column]) for column in df.columns})
+    tmp = path.with_suffix('.tmp')
+    with pa.OSFile(str(tmp), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Readers may have the old file mapped; replacing keeps their pages valid
+    os.replace(tmp, path)
+
+
+def _read_table(path):
+    if not path.exists():
+        return None
+    pa = _pyarrow()
+    table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _scales(raw):
+    columns = [c for c in raw.columns if c.endswith('_scale') and c[:-len('_scale')] in raw.columns]
+    return raw[['year'] + columns]
+
+
+def write_snapshot(dataset, directory=None):
+    """Write every table of `dataset` as Arrow IPC files; returns the snapshot directory."""
+    directory = Path(directory) if directory else snapshot_dir(dataset.data_dir, dataset.company)
+    directory.mkdir(parents=True, exist_ok=True)
+    if dataset.financials is not None:
+        _write_table(dataset.financials, directory / 'financials.arrow')
+        _write_table(_scales(dataset.financials_raw), directory / 'financial_scales.arrow')
+    if dataset.right_issues is not None:
+        _write_table(dataset.right_issues, directory / 'right_issues.arrow')
+    if dataset.shareholders:
+        frames = [df.assign(fiscal_year=fiscal_year) for fiscal_year, df in dataset.shareholders.items()]
+        long = pd.concat(frames, ignore_index=True)
+        if 'rank' not in long.columns:
+            long['rank'] = np.nan
+        long = long[['fiscal_year', 'rank', 'shareholder_name', 'ownership_percentage']]
+        _write_table(long.astype({'rank': float}), directory / 'shareholders.arrow')
+    return directory
+
+
+def read_financials(directory):
+    return _read_table(Path(directory) / 'financials.arrow')
+
+
+def read_financial_scales(directory):
+    scales = _read_table(Path(directory) / 'financial_scales.arrow')
+    return pd.DataFrame(columns=['year']) if scales is None else scales
+
+
+def read_right_issues(directory):
+    return _read_table(Path(directory) / 'right_issues.arrow')
+
+
+def read_shareholders(directory):
+    """{fiscal_year: frame}, oldest year first; rank is only kept for years that recorded it."""
+    long = _read_table(Path(directory) / 'shareholders.arrow')
+    if long is None:
+        return {}
+    result = {}
+    for fiscal_year, group in long.groupby('fiscal_year', sort=True):
+        group = group.drop(columns='fiscal_year').reset_index(drop=True)
+        if group['rank'].isna().all():
+            group = group.drop(columns='rank')
+        else:
+            group['rank'] = group['rank'].astype(int)
+        result[fiscal_year] = group
+    return result
+
+
+def build_snapshot(data_dir, company):
+    """Snapshot `company` from the SQLite store or the CSVs in `data_dir`."""
+    from dataset import Dataset, data_version
+
+    # Read from the store or the CSVs, never from the snapshot being replaced
+    dataset = Dataset(data_dir, data_version(data_dir), company, sources=('store', 'csv'))
+    directory = write_snapshot(dataset)
+    logger.info(f"Wrote {company} snapshot to {directory}")
+    return directory
+
+
+def main():
+    from dataset import DATA_DIR, DEFAULT_COMPANY
+
+    parser = argparse.ArgumentParser(description='Write the memory-mapped Arrow snapshot served by the API.')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--company', default=DEFAULT_COMPANY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not PYARROW_AVAILABLE:
+        parser.error('pyarrow is required to write a snapshot')
+    build_snapshot(args.data_dir, args.company)
+
+
+if __name__ == '__main__':
+    main()
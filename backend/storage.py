@@ -0,0 +1,287 @@
+"""
+SQLite store for the cleaned data, written by the extractor and read by the API.
+
+Financial metrics are stored as typed REAL columns already scaled to absolute
+values, one row per (company, year); the scale each value was reported in is
+kept in a separate long table. Right issues and shareholders are stored one row
+per entry, indexed by company and year, so readers fetch only the columns and
+rows they ask for instead of parsing whole files.
+
+Build the store from existing CSVs with:
+    python storage.py --data-dir data_cleaned --company JKH
+"""
+import argparse
+import logging
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+STORE_FILE = 'dashboard.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS financials (
+    company TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    PRIMARY KEY (company, year)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS financial_scales (
+    company TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    scale TEXT,
+    PRIMARY KEY (company, year, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS right_issues (
+    company TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    ratio TEXT,
+    issue_price REAL
+);
+CREATE INDEX IF NOT EXISTS right_issues_company_year ON right_issues (company, year);
+CREATE TABLE IF NOT EXISTS shareholders (
+    company TEXT NOT NULL,
+    fiscal_year TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    rank INTEGER,
+    shareholder_name TEXT NOT NULL,
+    ownership_percentage REAL
+);
+CREATE INDEX IF NOT EXISTS shareholders_company_year ON shareholders (company, fiscal_year);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def connect(path, readonly=False):
+    """Open the store; writers also create any missing tables, readers never modify the file."""
+    if readonly:
+        return sqlite3.connect(f'file:{Path(path).resolve()}?mode=ro', uri=True)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({_quote(table)})')]
+
+
+def _nullable(value):
+    return None if pd.isna(value) else value
+
+
+def _write_financials(conn, company, financials, scales):
+    metrics = [column for column in financials.columns if column != 'year']
+    existing = set(_table_columns(conn, 'financials'))
+    for metric in metrics:
+        if metric not in existing:
+            conn.execute(f'ALTER TABLE financials ADD COLUMN {_quote(metric)} REAL')
+    conn.execute('DELETE FROM financials WHERE company = ?', (company,))
+    conn.execute('DELETE FROM financial_scales WHERE company = ?', (company,))
+    columns = ', '.join(_quote(c) for c in ['company', 'year'] + metrics)
+    placeholders = ', '.join('?' * (len(metrics) + 2))
+    conn.executemany(
+        f'INSERT INTO financials ({columns}) VALUES ({placeholders})',
+        [
+            (company, int(row[0]), *(_nullable(v) for v in row[1:]))
+            for row in financials[['year'] + metrics].itertuples(index=False)
+        ]
+    )
+    if scales is not None:
+        long = scales.melt(id_vars='year', var_name='metric', value_name='scale')
+        conn.executemany(
+            'INSERT INTO financial_scales (company, year, metric, scale) VALUES (?, ?, ?, ?)',
+            [(company, int(y), m, _nullable(s)) for y, m, s in long.itertuples(index=False)]
+        )
+
+
+def _write_right_issues(conn, company, right_issues):
+    conn.execute('DELETE FROM right_issues WHERE company = ?', (company,))
+    ratio = right_issues['ratio'] if 'ratio' in right_issues.columns else pd.Series(None, index=right_issues.index)
+    prices = pd.to_numeric(right_issues['issue_price'], errors='coerce')
+    conn.executemany(
+        'INSERT INTO right_issues (company, year, position, ratio, issue_price) VALUES (?, ?, ?, ?, ?)',
+        [
+            (company, int(year), position, None if pd.isna(r) else str(r), _nullable(price))
+            for position, (year, r, price) in enumerate(zip(right_issues['year'], ratio, prices))
+        ]
+    )
+
+
+def _write_shareholders(conn, company, shareholders):
+    conn.execute('DELETE FROM shareholders WHERE company = ?', (company,))
+    for fiscal_year, df in shareholders.items():
+        ranks = df['rank'] if 'rank' in df.columns else pd.Series(None, index=df.index)
+        conn.executemany(
+            'INSERT INTO shareholders (company, fiscal_year, position, rank, shareholder_name, ownership_percentage) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (company, str(fiscal_year), position, None if pd.isna(rank) else int(rank), str(name), _nullable(pct))
+                for position, (rank, name, pct) in enumerate(
+                    zip(ranks, df['shareholder_name'], pd.to_numeric(df['ownership_percentage'], errors='coerce'))
+                )
+            ]
+        )
+
+
+def write_company(path, company, financials=None, scales=None, right_issues=None, shareholders=None):
+    """
+    Replace `company`'s data in the store at `path` in one transaction. `financials`
+    holds 'year' plus absolute-valued metric columns and `scales` the matching
+    reported scales; `shareholders` maps fiscal year to a frame. Parts left as
+    None are not touched.
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            if financials is not None:
+                _write_financials(conn, company, financials, scales)
+            if right_issues is not None:
+                _write_right_issues(conn, company, right_issues)
+            if shareholders is not None:
+                _write_shareholders(conn, company, shareholders)
+    finally:
+        conn.close()
+
+
+def _year_filter(column, start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f'{column} >= ?')
+        params.append(start)
+    if end is not None:
+        clauses.append(f'{column} <= ?')
+        params.append(end)
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+def companies(path):
+    conn = connect(path, readonly=True)
+    try:
+        return [row[0] for row in conn.execute('SELECT DISTINCT company FROM financials ORDER BY company')]
+    finally:
+        conn.close()
+
+
+def read_financials(path, company, metrics=None, start=None, end=None):
+    """
+    'year' plus `metrics` (every stored metric when None) for `company`, sorted
+    by year and restricted to the inclusive range [start, end]. Metrics missing
+    from the store come back as NaN columns.
+    """
+    conn = connect(path, readonly=True)
+    try:
+        stored = [c for c in _table_columns(conn, 'financials') if c not in ('company', 'year')]
+        metrics = stored if metrics is None else list(metrics)
+        selected = [metric for metric in metrics if metric in stored]
+        where, params = _year_filter('year', start, end)
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(_quote(c) for c in ['year'] + selected)} FROM financials "
+            f"WHERE company = ?{where} ORDER BY year",
+            conn, params=[company] + params
+        )
+    finally:
+        conn.close()
+    df = df.reindex(columns=['year'] + metrics)
+    return df.astype({metric: float for metric in metrics})
+
+
+def read_financial_scales(path, company):
+    """Wide frame of 'year' plus one '<metric>_scale' column per metric with a recorded scale."""
+    conn = connect(path, readonly=True)
+    try:
+        long = pd.read_sql_query(
+            'SELECT year, metric, scale FROM financial_scales WHERE company = ?', conn, params=[company]
+        )
+    finally:
+        conn.close()
+    if long.empty:
+        return pd.DataFrame(columns=['year'])
+    wide = long.pivot(index='year', columns='metric', values='scale')
+    wide.columns = [f'{metric}_scale' for metric in wide.columns]
+    return wide.reset_index()
+
+
+def read_right_issues(path, company, start=None, end=None):
+    """`company`'s right issues (year, ratio, issue_price) in stored order, or None if it has none."""
+    conn = connect(path, readonly=True)
+    try:
+        where, params = _year_filter('year', start, end)
+        df = pd.read_sql_query(
+            f'SELECT year, ratio, issue_price FROM right_issues WHERE company = ?{where} ORDER BY position',
+            conn, params=[company] + params
+        )
+    finally:
+        conn.close()
+    if df.empty and start is None and end is None:
+        return None
+    return df.astype({'issue_price': float})
+
+
+def read_shareholders(path, company, fiscal_years=None):
+    """
+    {fiscal_year: frame} for `company`, oldest year first. The rank column is
+    only included when ranks were recorded.
+    """
+    conn = connect(path, readonly=True)
+    try:
+        query = ('SELECT fiscal_year, rank, shareholder_name, ownership_percentage '
+                 'FROM shareholders WHERE company = ?')
+        params = [company]
+        if fiscal_years is not None:
+            query += f" AND fiscal_year IN ({', '.join('?' * len(fiscal_years))})"
+            params += list(fiscal_years)
+        df = pd.read_sql_query(query + ' ORDER BY fiscal_year, position', conn, params=params)
+    finally:
+        conn.close()
+    result = {}
+    for fiscal_year, group in df.groupby('fiscal_year', sort=True):
+        group = group.drop(columns='fiscal_year').reset_index(drop=True)
+        if group['rank'].isna().all():
+            group = group.drop(columns='rank')
+        result[fiscal_year] = group
+    return result
+
+
+def import_csv(data_dir, company, path=None):
+    """Load the CSVs in `data_dir` into the store (data_dir/STORE_FILE unless `path` is given)."""
+    from dataset import FINANCIALS_FILE, RIGHT_ISSUES_FILE, SHAREHOLDERS_PREFIX, normalize_financials
+
+    data_dir = Path(data_dir)
+    path = Path(path) if path else data_dir / STORE_FILE
+    financials = scales = right_issues = None
+    if (data_dir / FINANCIALS_FILE).exists():
+        raw = pd.read_csv(data_dir / FINANCIALS_FILE)
+        financials = normalize_financials(raw).sort_values('year').reset_index(drop=True)
+        scale_columns = [c for c in raw.columns if c.endswith('_scale') and c[:-len('_scale')] in raw.columns]
+        scales = raw[['year'] + scale_columns].rename(columns=lambda c: c[:-len('_scale')] if c != 'year' else c)
+    if (data_dir / RIGHT_ISSUES_FILE).exists():
+        right_issues = pd.read_csv(data_dir / RIGHT_ISSUES_FILE)
+    shareholders = {
+        p.stem[len(SHAREHOLDERS_PREFIX):]: pd.read_csv(p)
+        for p in sorted(data_dir.glob(f'{SHAREHOLDERS_PREFIX}*.csv'))
+    }
+    write_company(path, company, financials, scales, right_issues, shareholders)
+    logger.info(f"Stored {company} data from {data_dir} in {path}")
+    return path
+
+
+def main():
+    from dataset import DATA_DIR, DEFAULT_COMPANY
+
+    parser = argparse.ArgumentParser(description='Load the cleaned CSVs into the SQLite data store.')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--company', default=DEFAULT_COMPANY)
+    parser.add_argument('--output', help=f'store path (default: <data-dir>/{STORE_FILE})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    import_csv(args.data_dir, args.company, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from currency import BASE_CURRENCY, RATES_FILE, convert_financials, load_rates
+
+# *_usd values the extractor stored (scaled to units) before they were computed from
+# the rates, for the cells whose LKR and USD scales were recorded consistently
+STORED_USD = {
+    (2019, 'total_revenue'): (182000.0e3, 1018.0109631949883e3),
+    (2021, 'total_revenue'): (196121000.0e3, 986127.3129525342e3),
+    (2022, 'total_revenue'): (7121807000000000.0e3, 19788843813387.426e3),
+    (2019, 'eps'): (1228000000000.0e3, 6868777.2681508e6),
+    (2021, 'eps'): (3671111000000.0e3, 18458924.97988737e6),
+    (2019, 'net_profit'): (2580000000000.0e3, 14431144423.31357e3),
+    (2020, 'net_profit'): (2580000000000.0e3, 13906856403.62225e3),
+    (2022, 'net_profit'): (2022121.0e3, 5618.719608769346e3),
+    (2021, 'operating_expenses'): (12232000000000.0e3, 61504424778.76106e3),
+    (2019, 'cost_of_sales'): (205689.0e3, 1150.5145989484283e3),
+}
+
+
+def test_seeded_usd_rates_reproduce_stored_values():
+    rates = load_rates(RATES_FILE)
+    for (year, metric), (lkr, usd) in STORED_USD.items():
+        frame = pd.DataFrame({'year': [year], f'{metric}_lkr': [lkr]})
+        converted = convert_financials(frame, 'USD', rates)
+        assert converted[f'{metric}_usd'].iloc[0] == pytest.approx(usd, rel=1e-9), (year, metric)
+
+
+def test_year_without_a_rate_converts_to_nan():
+    frame = pd.DataFrame({'year': [2019, 1990], 'eps_lkr': [178.78, 1.0]})
+    converted = convert_financials(frame, 'USD', load_rates(RATES_FILE))
+    assert converted['eps_usd'].iloc[0] == pytest.approx(1.0)
+    assert np.isnan(converted['eps_usd'].iloc[1])
+
+
+def test_unknown_currency_is_not_supported():
+    rates = load_rates(RATES_FILE)
+    assert rates.supports('USD') and rates.supports(BASE_CURRENCY)
+    assert not rates.supports('XYZ')
+    assert np.isnan(rates.per_unit('XYZ', [2019])).all()
+
+
+def test_invalid_rate_file_keeps_only_lkr(tmp_path):
+    path = tmp_path / 'rates.csv'
+    path.write_text('year,currency,lkr_per_unit\n2019,USD,-1\n')
+    rates = load_rates(path)
+    assert rates.currencies == []
+    assert rates.supports(BASE_CURRENCY)
+
+
+def test_api_rejects_unknown_currency(tmp_path):
+    from app import create_app
+
+    data_dir = tmp_path / 'data'
+    shutil.copytree(RATES_FILE.parent.parent, data_dir)
+    rates_file = data_dir / 'rates' / RATES_FILE.name
+    client = create_app({'DATA_DIR': data_dir, 'REPORT_WORKERS': 0, 'RATES_FILE': rates_file}).test_client()
+
+    response = client.get('/api/financials?currency=XYZ')
+    assert response.status_code == 400
+    assert 'XYZ' in response.get_json()['error']
+    assert client.get('/api/financials?currency=usd').status_code == 200
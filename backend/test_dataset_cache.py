@@ -0,0 +1,45 @@
+from dataset import DatasetCache
+
+
+class FakeDataset:
+    def __init__(self, version, nbytes):
+        self.version = version
+        self.nbytes = nbytes
+
+
+def _load(cache, company, nbytes=100, version='v1'):
+    return cache.get(('data', company), version, lambda: FakeDataset(version, nbytes))
+
+
+def test_evicts_least_recently_used_over_budget():
+    cache = DatasetCache(max_bytes=250)
+    a = _load(cache, 'A')
+    _load(cache, 'B')
+    # Touching A makes B the least recently used
+    assert _load(cache, 'A') is a
+    _load(cache, 'C')
+
+    assert len(cache) == 2
+    assert cache.nbytes == 200
+    assert _load(cache, 'A') is a
+    reloaded = []
+    cache.get(('data', 'B'), 'v1', lambda: reloaded.append('B') or FakeDataset('v1', 100))
+    assert reloaded == ['B']
+
+
+def test_keeps_requested_dataset_larger_than_budget():
+    cache = DatasetCache(max_bytes=50)
+    _load(cache, 'A', nbytes=10)
+    big = _load(cache, 'B', nbytes=500)
+
+    assert len(cache) == 1
+    assert _load(cache, 'B') is big
+
+
+def test_drops_entries_of_older_versions():
+    cache = DatasetCache(max_bytes=1000)
+    _load(cache, 'A', version='v1')
+    _load(cache, 'B', version='v2')
+
+    assert len(cache) == 1
+    assert _load(cache, 'B', version='v2').version == 'v2'
@@ -0,0 +1,69 @@
+import multiprocessing
+import socket
+import time
+
+import pandas as pd
+import pytest
+
+import forecast_jobs
+
+
+@pytest.fixture
+def queue(tmp_path):
+    path = tmp_path / forecast_jobs.QUEUE_FILE
+    forecast_jobs.configure(max_workers=1, max_pending=4, queue_path=path)
+    yield path
+    forecast_jobs._reset_executor()
+
+
+def _frame():
+    return pd.DataFrame({'year': range(2015, 2024), 'eps_lkr': [float(2 * i + 1) for i in range(9)]})
+
+
+def _poll(queue_path, job_id):
+    # Runs in a separate process, as a poll answered by another gunicorn worker would
+    forecast_jobs.configure(queue_path=queue_path)
+    return forecast_jobs.status(job_id, wait=20)
+
+
+def test_job_submitted_in_one_process_is_polled_from_another(queue):
+    job_id = forecast_jobs.submit(_frame(), 'eps_lkr', 2, 'linear', 'v1')
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        state = pool.apply(_poll, (queue, job_id))
+
+    assert state['status'] == 'done'
+    assert [row['year'] for row in state['result'] if row['forecast'] is not None] == [2024, 2025]
+    assert forecast_jobs.status(job_id) == state
+
+
+def test_identical_requests_share_a_job(queue):
+    first = forecast_jobs.submit(_frame(), 'eps_lkr', 2, 'linear', 'v1')
+    assert forecast_jobs.submit(_frame(), 'eps_lkr', 2, 'linear', 'v1') == first
+    assert forecast_jobs.submit(_frame(), 'eps_lkr', 2, 'linear', 'v2') != first
+
+
+def test_batch_over_the_queue_bound_is_refused_whole(queue):
+    frame = _frame().assign(**{f'm{i}': 1.0 for i in range(5)})
+    with pytest.raises(forecast_jobs.QueueFullError):
+        forecast_jobs.submit_batch(frame, [f'm{i}' for i in range(5)], 2, 'linear', 'v1')
+    # Nothing was queued, so a batch within the bound still fits
+    assert len(forecast_jobs.submit_batch(frame, [f'm{i}' for i in range(4)], 2, 'linear', 'v1')) == 4
+
+
+def test_job_of_exited_process_is_failed(queue):
+    process = multiprocessing.get_context('spawn').Process(target=time.sleep, args=(0,))
+    process.start()
+    process.join()
+    conn = forecast_jobs.connect(queue)
+    now = time.time()
+    conn.execute(
+        'INSERT INTO jobs (id, job_key, metric, periods, engine, status, owner, created_at, updated_at) '
+        "VALUES ('orphan', 'k', 'eps_lkr', 2, 'prophet', 'running', ?, ?, ?)",
+        (f'{socket.gethostname()}:{process.pid}', now, now)
+    )
+    conn.close()
+
+    state = forecast_jobs.status('orphan')
+    assert state['status'] == 'failed'
+    assert 'submit it again' in state['error']
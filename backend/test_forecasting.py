@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import FAST_ENGINES, _fill_gaps, forecast_batch_response, forecast_matrix, forecast_response
+
+YEARS = [2015, 2016, 2017, 2018, 2019, 2020]
+
+
+def test_fill_gaps_forward_fills_and_back_fills_leading_nans():
+    values = [[np.nan, np.nan, 3.0, np.nan, 5.0], [1.0, np.nan, np.nan, 4.0, np.nan]]
+    assert _fill_gaps(values).tolist() == [[3.0, 3.0, 3.0, 3.0, 5.0], [1.0, 1.0, 1.0, 4.0, 4.0]]
+
+
+def test_fill_gaps_leaves_all_nan_rows():
+    assert np.isnan(_fill_gaps([[np.nan, np.nan]])).all()
+
+
+def test_linear_exact_series_gives_exact_forecasts():
+    values = [[10.0 + 5 * i for i in range(len(YEARS))]]
+    future_years, yhat, lower, upper = forecast_matrix(YEARS, values, periods=3, engine='linear')
+
+    assert future_years == [2021, 2022, 2023]
+    assert yhat[0] == pytest.approx([40.0, 45.0, 50.0])
+    # No residuals, so no interval
+    assert lower[0] == pytest.approx(yhat[0])
+    assert upper[0] == pytest.approx(yhat[0])
+
+
+def test_loglinear_exact_growth_gives_exact_forecasts():
+    values = [[100.0 * 1.1 ** i for i in range(len(YEARS))]]
+    _, yhat, _, _ = forecast_matrix(YEARS, values, periods=2, engine='loglinear')
+    assert yhat[0] == pytest.approx([100.0 * 1.1 ** 6, 100.0 * 1.1 ** 7])
+
+
+def test_linear_ignores_gaps_and_leading_nans():
+    exact = [10.0 + 5 * i for i in range(len(YEARS))]
+    gappy = [np.nan, exact[1], np.nan, exact[3], exact[4], exact[5]]
+    _, yhat, _, _ = forecast_matrix(YEARS, [exact, gappy], periods=2, engine='linear')
+    assert yhat[1] == pytest.approx(yhat[0])
+
+
+def test_holt_constant_series_stays_constant():
+    _, yhat, lower, upper = forecast_matrix(YEARS, [[7.0] * len(YEARS)], periods=3, engine='holt')
+    assert yhat[0] == pytest.approx([7.0] * 3)
+    assert upper[0] - lower[0] == pytest.approx([0.0] * 3)
+
+
+def test_holt_fills_gaps_and_leading_nans():
+    _, yhat, lower, upper = forecast_matrix(YEARS, [[np.nan, np.nan, 7.0, np.nan, 7.0, 7.0]], engine='holt')
+    assert yhat[0] == pytest.approx([7.0] * 3)
+    assert np.isfinite(lower).all() and np.isfinite(upper).all()
+
+
+def test_rows_are_forecast_independently():
+    values = [[1.0, 2.0, 3.0, 4.0, 5.0, 6.0], [np.nan] * len(YEARS), [6.0, 5.0, 4.0, 3.0, 2.0, 1.0]]
+    for engine in FAST_ENGINES:
+        _, alone, _, _ = forecast_matrix(YEARS, values[:1], engine=engine)
+        _, together, _, _ = forecast_matrix(YEARS, values, engine=engine)
+        assert together[0] == pytest.approx(alone[0])
+
+
+@pytest.mark.parametrize('engine', FAST_ENGINES)
+def test_all_nan_metric_has_no_forecast(engine):
+    frame = pd.DataFrame({'year': YEARS, 'revenue': [float(i + 1) for i in range(6)], 'empty': [np.nan] * 6})
+    result = forecast_batch_response(frame, ['revenue', 'empty'], periods=2, engine=engine)
+
+    assert result['empty'] == []
+    assert [row['year'] for row in result['revenue'] if row['forecast'] is not None] == [2021, 2022]
+
+
+@pytest.mark.parametrize('engine', FAST_ENGINES)
+def test_single_year_gives_finite_intervals(engine):
+    _, yhat, lower, upper = forecast_matrix([2020], [[50.0]], periods=3, engine=engine)
+    for values in (yhat, lower, upper):
+        assert np.isfinite(values).all()
+    assert yhat[0] == pytest.approx([50.0] * 3)
+
+    rows = forecast_response(pd.DataFrame({'year': [2020], 'eps': [50.0]}), 'eps', periods=1, engine=engine)
+    assert rows == [{'year': 2020, 'forecast': None},
+                    {'year': 2021, 'forecast': pytest.approx(50.0), 'lower': pytest.approx(50.0),
+                     'upper': pytest.approx(50.0)}]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ratios import RATIOS, RatioView, compute_ratios
+
+
+def _frame(**columns):
+    return pd.DataFrame(columns)
+
+
+def _column(matrix, name):
+    return matrix[:, RATIOS.index(name)]
+
+
+def test_margins_and_per_share_ratios():
+    frame = _frame(year=[2020], total_revenue_lkr=[200.0], cost_of_sales_lkr=[120.0],
+                   operating_expenses_lkr=[30.0], net_profit_lkr=[40.0], share_count=[10.0],
+                   eps_lkr=[4.0], net_asset_per_share_lkr=[20.0])
+    _, matrix = compute_ratios(frame)
+
+    assert _column(matrix, 'gross_margin')[0] == pytest.approx(40.0)
+    assert _column(matrix, 'operating_margin')[0] == pytest.approx(25.0)
+    assert _column(matrix, 'net_margin')[0] == pytest.approx(20.0)
+    assert _column(matrix, 'revenue_per_share_lkr')[0] == pytest.approx(20.0)
+    assert _column(matrix, 'earnings_per_share_lkr')[0] == pytest.approx(4.0)
+    assert _column(matrix, 'return_on_equity')[0] == pytest.approx(20.0)
+
+
+def test_division_by_zero_or_missing_is_nan():
+    frame = _frame(year=[2020, 2021], total_revenue_lkr=[0.0, np.nan], net_profit_lkr=[5.0, 5.0],
+                   share_count=[0.0, 10.0])
+    _, matrix = compute_ratios(frame)
+
+    assert np.isnan(_column(matrix, 'net_margin')).all()
+    assert np.isnan(_column(matrix, 'earnings_per_share_lkr')[0])
+    assert _column(matrix, 'earnings_per_share_lkr')[1] == pytest.approx(0.5)
+    # Metrics the frame lacks give NaN rather than an error
+    assert np.isnan(_column(matrix, 'gross_margin')).all()
+
+
+def test_growth_uses_the_exact_prior_year():
+    # 2022 is missing, so 2023 has no year-on-year change; rows arrive unsorted
+    frame = _frame(year=[2023, 2020, 2021], total_revenue_lkr=[300.0, 100.0, 150.0])
+    years, matrix = compute_ratios(frame)
+
+    assert years.tolist() == [2020, 2021, 2023]
+    yoy = _column(matrix, 'total_revenue_yoy')
+    assert np.isnan(yoy[0])
+    assert yoy[1] == pytest.approx(50.0)
+    assert np.isnan(yoy[2])
+
+
+def test_yoy_from_a_negative_base_keeps_the_direction():
+    frame = _frame(year=[2020, 2021], net_profit_lkr=[-100.0, -50.0])
+    _, matrix = compute_ratios(frame)
+    assert _column(matrix, 'net_profit_yoy')[1] == pytest.approx(50.0)
+
+
+def test_cagr_needs_positive_values_n_years_apart():
+    frame = _frame(year=[2018, 2019, 2020, 2021, 2022], total_revenue_lkr=[100.0, 1.0, 1.0, 133.1, 1.0],
+                   net_profit_lkr=[-10.0, 1.0, 1.0, 20.0, 1.0])
+    _, matrix = compute_ratios(frame)
+
+    cagr = _column(matrix, 'total_revenue_cagr_3y')
+    assert cagr[3] == pytest.approx(10.0)
+    assert np.isnan(cagr[:3]).all()
+    assert np.isnan(_column(matrix, 'net_profit_cagr_3y')[3])
+    assert np.isnan(_column(matrix, 'total_revenue_cagr_5y')).all()
+
+
+def test_empty_frame():
+    years, matrix = compute_ratios(_frame(year=[], total_revenue_lkr=[]))
+    assert len(years) == 0
+    assert matrix.shape == (0, len(RATIOS))
+
+
+def test_view_query_by_year_range_and_ratio():
+    view = RatioView()
+    view.add('ACME', _frame(year=[2020, 2021, 2022], total_revenue_lkr=[100.0, 110.0, 0.0],
+                            net_profit_lkr=[10.0, 11.0, 1.0]))
+
+    result = view.query('ACME', start=2021, end=2022, ratios=['net_margin'])
+    assert result == {'year': [2021, 2022], 'net_margin': [pytest.approx(10.0), None]}
+    assert view.query('ACME', start=2030)['year'] == []
+    with pytest.raises(KeyError):
+        view.query('ACME', ratios=['no_such_ratio'])
+    with pytest.raises(KeyError):
+        view.query('OTHER')
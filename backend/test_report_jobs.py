@@ -0,0 +1,45 @@
+import time
+
+import report_jobs
+
+
+def _enqueue(tmp_path, key='abc'):
+    pdf = tmp_path / 'report.pdf'
+    pdf.write_bytes(b'%PDF-1.4')
+    queue = tmp_path / report_jobs.QUEUE_FILE
+    return queue, report_jobs.enqueue(queue, pdf, key)
+
+
+def _expire_lease(queue, job_id):
+    conn = report_jobs.connect(queue)
+    try:
+        conn.execute('UPDATE jobs SET updated_at = ? WHERE id = ?',
+                     (time.time() - report_jobs.LEASE_SECONDS - 1, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_claim_requeues_job_after_expired_lease(tmp_path):
+    queue, job_id = _enqueue(tmp_path)
+    assert report_jobs.claim(queue, 'worker-1')['id'] == job_id
+    # Within the lease the job stays with its worker
+    assert report_jobs.claim(queue, 'worker-2') is None
+
+    _expire_lease(queue, job_id)
+    job = report_jobs.claim(queue, 'worker-2')
+    assert job['id'] == job_id
+    assert job['status'] == 'running'
+    assert job['attempts'] == 2
+
+
+def test_claim_fails_job_once_attempts_are_used(tmp_path):
+    queue, job_id = _enqueue(tmp_path)
+    for attempt in range(report_jobs.MAX_ATTEMPTS):
+        assert report_jobs.claim(queue, f'worker-{attempt}')['id'] == job_id
+        _expire_lease(queue, job_id)
+
+    assert report_jobs.claim(queue, 'worker-last') is None
+    job = report_jobs.get_job(queue, job_id)
+    assert job['status'] == 'failed'
+    assert 'stopped responding' in job['error']
@@ -0,0 +1,41 @@
+import base64
+
+import pytest
+
+from right_issues import cursor_scope, decode_cursor, encode_cursor
+
+
+def _tamper(cursor, offset):
+    version, scope, _ = base64.urlsafe_b64decode(cursor).decode().split(':')
+    return base64.urlsafe_b64encode(f'{version}:{scope}:{offset}'.encode()).decode()
+
+
+def test_cursor_round_trip():
+    scope = cursor_scope('ACME', 2019, None, 10.0, None, ['year'])
+    assert decode_cursor(encode_cursor('v1', 40, scope), 'v1', scope) == 40
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', '', base64.urlsafe_b64encode(b'v1:40').decode()])
+def test_rejects_malformed_cursor(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, 'v1')
+
+
+def test_rejects_negative_offset():
+    cursor = _tamper(encode_cursor('v1', 40), -5)
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, 'v1')
+
+
+def test_rejects_stale_cursor():
+    with pytest.raises(ValueError, match='older version'):
+        decode_cursor(encode_cursor('v1', 40), 'v2')
+
+
+def test_rejects_cursor_issued_for_other_filters():
+    cursor = encode_cursor('v1', 40, cursor_scope('ACME', 2019, None, None, None, None))
+    for other in (cursor_scope('ACME', 2020, None, None, None, None),
+                  cursor_scope('OTHER', 2019, None, None, None, None),
+                  cursor_scope('ACME', 2019, None, None, None, ['year'])):
+        with pytest.raises(ValueError, match='different filters'):
+            decode_cursor(cursor, 'v1', other)
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from shareholders import ShareholderIndex, build_shareholder_index, canonical_name
+
+
+@pytest.mark.parametrize('variants', [
+    ['HWIC Asia Fund', 'HWIC  Asia Fund', 'hwic asia fund ', 'HWIC Asia Fund.'],
+    ['Paints & General Industries Limited', 'Paints and General Industries Limited',
+     'Paints & General Industries Ltd', 'PAINTS AND GENERAL INDUSTRIES'],
+    ['Bank of Ceylon A/C Trust Fund', 'Bank of Ceylon Account Trust Fund', 'Bank of Ceylon Acc Trust Fund'],
+])
+def test_spelling_variants_share_a_canonical_key(variants):
+    assert len({canonical_name(name) for name in variants}) == 1
+
+
+def test_legal_suffix_alone_is_kept():
+    assert canonical_name('Limited') == 'limited'
+
+
+def test_resolve_returns_the_holder_for_each_spelling():
+    index = ShareholderIndex()
+    hwic = index.add('HWIC Asia Fund')
+    paints = index.add('Paints & General Industries Limited')
+
+    assert index.resolve('HWIC  Asia Fund') == hwic
+    assert index.resolve('Paints and General Industries Ltd') == paints
+    assert index.resolve('Unknown Holder') is None
+
+
+def test_holder_sharing_only_a_common_token_does_not_match():
+    index = ShareholderIndex()
+    hwic = index.add('HWIC Asia Fund')
+    pacific = index.add('Asia Pacific Growth Fund')
+
+    assert index.resolve('Emerging Asia Fund') is None
+    assert index.add('Emerging Asia Fund') not in (hwic, pacific)
+
+
+def test_fuzzy_match_with_unseen_tokens():
+    index = ShareholderIndex()
+    words = 'alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november'
+    holder = index.add(words)
+    # Two tokens no holder has must not crowd the known ones out of blocking
+    assert index.resolve(f'{words} xray yankee') == holder
+
+
+def test_history_follows_a_holder_across_spellings():
+    class FakeDataset:
+        shareholders = {
+            '2019_20': pd.DataFrame({'shareholder_name': ['HWIC Asia Fund', 'Other Holder'],
+                                     'ownership_percentage': [5.0, 7.0]}),
+            '2020_21': pd.DataFrame({'shareholder_name': ['HWIC  Asia Fund'], 'ownership_percentage': [6.0]}),
+        }
+
+    index = build_shareholder_index(FakeDataset())
+    history = index.history(index.resolve('HWIC Asia Fund'))
+    assert [(row['fiscal_year'], row['ownership_percentage'], row['rank']) for row in history['history']] == [
+        ('2019_20', 5.0, 2), ('2020_21', 6.0, 1),
+    ]
@@ -0,0 +1,19 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    python report_jobs.py --workers 2     # report extraction, which the web workers leave out
+
+With preload_app the gunicorn master imports this module, so the data is
+loaded, indexed and encoded once before any worker forks. Workers share those
+pages copy-on-write and serve their first request from warm caches.
+"""
+import gc
+
+from app import config_from_env, create_app
+
+app = create_app(config_from_env())
+
+# Everything built so far lives as long as its data version. Freezing it keeps
+# the workers' garbage collector from writing to (and so copying) those pages.
+gc.freeze()
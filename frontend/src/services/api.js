@@ -11,9 +11,12 @@ const api = axios.create({
   },
 });
 
-export const fetchFinancialData = async () => {
+// years: '2020-2023'; metrics: ['eps_lkr', ...] to fetch only the columns a chart plots
+export const fetchFinancialData = async ({ years, metrics, company, currency } = {}) => {
   try {
-    const response = await api.get('/financials');
+    const response = await api.get('/financials', {
+      params: { years, metrics: metrics ? metrics.join(',') : undefined, company, currency },
+    });
     if (!response.data || !Array.isArray(response.data)) {
       throw new Error('Invalid data format received from server');
     }
@@ -24,6 +27,18 @@ export const fetchFinancialData = async () => {
   }
 };
 
+export const fetchRatios = async ({ years, metrics, company } = {}) => {
+  try {
+    const response = await api.get('/ratios', {
+      params: { years, metrics: metrics ? metrics.join(',') : undefined, company },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching financial ratios:', error);
+    throw error;
+  }
+};
+
 export const fetchShareholders = async () => {
   try {
     const response = await api.get('/shareholders');
@@ -35,4 +50,125 @@ export const fetchShareholders = async () => {
     console.error('Error fetching shareholders data:', error);
     throw error;
   }
-}; 
\ No newline at end of file
+}; 
+// Long-poll window per request, kept below the axios timeout above
+const FORECAST_POLL_WAIT_SECONDS = 8;
+
+export const fetchForecast = async (metric, { periods = 3, engine } = {}) => {
+  try {
+    const { data: job } = await api.post('/forecast/jobs', { metric, periods, engine });
+    let state = job;
+    while (state.status === 'queued' || state.status === 'running') {
+      const response = await api.get(`/forecast/jobs/${job.job_id}`, {
+        params: { wait: FORECAST_POLL_WAIT_SECONDS },
+      });
+      state = response.data;
+    }
+    if (state.status !== 'done') {
+      throw new Error(state.error || 'Forecast job failed');
+    }
+    return state.result;
+  } catch (error) {
+    console.error('Error fetching forecast:', error);
+    throw error;
+  }
+};
+
+export const fetchForecastBatch = async (metrics, { periods = 3, engine } = {}) => {
+  try {
+    const response = await api.get('/forecast/batch', {
+      params: { metrics: metrics.join(','), periods, engine },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching batch forecast:', error);
+    throw error;
+  }
+};
+
+export const fetchShareholdersMatrix = async () => {
+  try {
+    const response = await api.get('/shareholders/matrix');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching shareholder ownership matrix:', error);
+    throw error;
+  }
+};
+
+export const fetchRightIssuesPage = async ({ cursor, limit = 500, ...filters } = {}) => {
+  try {
+    const response = await api.get('/right-issues', { params: { ...filters, limit, cursor } });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching right issues:', error);
+    throw error;
+  }
+};
+
+export const fetchDashboard = async ({ years, forecast = false, company, currency } = {}) => {
+  try {
+    const response = await api.get('/dashboard', {
+      params: { years, forecast: forecast ? 1 : undefined, company, currency },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching dashboard data:', error);
+    throw error;
+  }
+};
+
+export const fetchReportData = async (report) => {
+  try {
+    const response = await api.get(report ? `/financial-data/${report}` : '/financial-data');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching annual report data:', error);
+    throw error;
+  }
+};
+
+export const uploadReport = async (file, year) => {
+  try {
+    const form = new FormData();
+    form.append('file', file);
+    if (year) form.append('year', year);
+    const response = await api.post('/reports', form, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error uploading annual report:', error);
+    throw error;
+  }
+};
+
+export const fetchReportJob = async (jobId) => {
+  try {
+    const response = await api.get(`/reports/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching report job:', error);
+    throw error;
+  }
+};
+
+export const fetchCompanies = async () => {
+  try {
+    const response = await api.get('/companies');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching companies:', error);
+    throw error;
+  }
+};
+
+export const fetchCurrencies = async () => {
+  try {
+    const response = await api.get('/currencies');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching currencies:', error);
+    throw error;
+  }
+};